@@ -3,29 +3,46 @@
 # Set breakpoints in your code and use the "Python: Streamlit App" or "Python: Debug chat.py" launch configuration
 
 import streamlit as st
-import asyncio
 import logging
-from chat import get_chat_service
-from multi_agent import get_multi_agent_service
+import time
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from background_loop import get_background_loop
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Initialize chat service once when the app starts
+# Initialize the chat sessions once when the app starts - they share one kernel and its plugins
 @st.cache_resource
-def initialize_chat_service():
-    """Initialize chat service once and cache it"""
-    return get_chat_service()
+def initialize_chat_sessions():
+    """Initialize the pool of per-session chat services once and cache it"""
+    # Imported here so the startup report includes loading chat and Semantic Kernel
+    imports_started = time.perf_counter()
+    from chat import get_chat_sessions
+    from plugin_loading import startup_timer
+    startup_timer.record("imports", time.perf_counter() - imports_started)
+    return get_chat_sessions()
 
 # Initialize multi-agent service once when the app starts
 @st.cache_resource
 def initialize_multi_agent_service():
     """Initialize multi-agent service once and cache it"""
+    from multi_agent import get_multi_agent_service
     return get_multi_agent_service()
 
+# Run every coroutine on one long-lived event loop, so async clients keep their connections across turns
+@st.cache_resource
+def initialize_background_loop():
+    """Start the background event loop once and cache it"""
+    return get_background_loop()
+
 # Get the service instances once at module level
-chat_service = initialize_chat_service()
+chat_sessions = initialize_chat_sessions()
 multi_agent_service = initialize_multi_agent_service()
+background_loop = initialize_background_loop()
+
+def get_session_chat_service():
+    """Get the chat service holding this browser session's conversation"""
+    return chat_sessions.get(get_script_run_ctx().session_id)
 
 def configure_sidebar():
     """Configure a clean, modern sidebar"""
@@ -291,7 +308,7 @@ def render_chat_ui(title, on_submit):
         if st.button("🔄 Reset", key=f"new_chat_{title}", use_container_width=True, type="secondary"):
             if title == "Chat":
                 st.session_state.chat_history = []
-                chat_service.reset_chat_history()
+                get_session_chat_service().reset_chat_history()
                 st.success("Chat reset!")
             elif title == "Multi-Agent":
                 st.session_state.multi_agent_history = []
@@ -315,13 +332,23 @@ def chat():
 
     def on_chat_submit(user_input):
         if user_input:
+            chat_service = get_session_chat_service()
             try:
                 # Add user message
                 st.session_state.chat_history.append({"role": "user", "message": user_input})
                 
-                # Show processing indicator
-                with st.spinner("Processing..."):
-                    assistant_response = asyncio.run(chat_service.process_message(user_input))
+                if chat_service.supports_streaming():
+                    # Render tokens below the conversation as they arrive; write_stream
+                    # returns the full text once the response is complete
+                    display_chat_history(st.session_state.chat_history)
+                    with st.chat_message("assistant", avatar="🤖"):
+                        assistant_response = st.write_stream(
+                            background_loop.iterate(chat_service.process_message_stream(user_input))
+                        )
+                else:
+                    # Show processing indicator
+                    with st.spinner("Processing..."):
+                        assistant_response = background_loop.run(chat_service.process_message(user_input))
                 
                 # Add assistant response
                 st.session_state.chat_history.append({"role": "assistant", "message": str(assistant_response)})
@@ -365,7 +392,7 @@ def multi_agent():
                 
                 with st.spinner("Team collaborating..."):
                     # Process the request - the callback will update the multi_agent_service's chat history
-                    asyncio.run(multi_agent_service.process_request(user_input))
+                    background_loop.run(multi_agent_service.process_request(user_input))
                 
                 # Get the latest messages from the service's chat history and sync to UI
                 service_history = multi_agent_service.chat_history.messages
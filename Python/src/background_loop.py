@@ -0,0 +1,90 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import AsyncIterator, Awaitable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class BackgroundEventLoop:
+    """An asyncio event loop that runs for the life of the process in a daemon thread.
+
+    Streamlit runs the app script synchronously, so coroutines are submitted to this
+    loop from the script thread instead of each one getting its own asyncio.run().
+    Async clients (Azure OpenAI, AI Search, aiohttp/httpx sessions) bind their
+    connection pools to the loop they are first used on, so keeping one loop
+    alive lets keep-alive connections and caches survive from one turn to the next.
+    """
+
+    def __init__(self, name: str = "background-event-loop"):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coroutine: Awaitable[T]) -> concurrent.futures.Future[T]:
+        """Schedule a coroutine on the loop and return a future for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, coroutine: Awaitable[T], timeout: float | None = None) -> T:
+        """Run a coroutine on the loop and wait for its result, cancelling it on timeout"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("BackgroundEventLoop.run() would block its own loop; await the coroutine instead")
+        future = self.submit(coroutine)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def iterate(self, generator: AsyncIterator[T], timeout: float | None = None) -> Iterator[T]:
+        """Drive an async generator on the loop and yield its items synchronously, e.g. for st.write_stream"""
+        # The task of the __anext__() step in progress, created on the loop
+        step = None
+
+        async def next_item():
+            nonlocal step
+            step = asyncio.ensure_future(generator.__anext__())
+            return await step
+
+        async def close():
+            # A step cancelled by run() may still be unwinding, and aclose() raises while it does
+            if step is not None and not step.done():
+                await asyncio.wait([step])
+            await generator.aclose()
+
+        try:
+            while True:
+                try:
+                    yield self.run(next_item(), timeout)
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Runs when the consumer stops early too, so the generator can clean up
+            if hasattr(generator, "aclose"):
+                self.run(close())
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def _run_forever(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+
+# Global instance - started on first use
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+def get_background_loop():
+    """Get the process-wide background event loop"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = BackgroundEventLoop()
+    return _background_loop
@@ -0,0 +1,33 @@
+import logging
+import re
+import sqlite3
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Runs of whitespace, collapsed when cache keys are normalized
+WHITESPACE = re.compile(r"\s+")
+
+
+def open_cache_database(path: str | Path | None, schema: str, name: str) -> sqlite3.Connection | None:
+    """Open the SQLite file of a cache, creating it, its directory and its table (schema) if needed.
+
+    The file is shared by every process using the same path; WAL mode lets them read
+    while another writes. Returns None if path is None or, after logging a warning, if
+    the file cannot be created or opened, e.g. in a read-only directory.
+    """
+    if path is None:
+        return None
+    conn = None
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(schema)
+        conn.commit()
+        return conn
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"{name} file {path} unavailable, caching in memory only: {e}")
+        if conn is not None:
+            conn.close()
+        return None
@@ -1,17 +1,30 @@
 import asyncio
+import copy
 import logging
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from semantic_kernel import Kernel
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion, AzureTextToImage, AzureChatPromptExecutionSettings
-from semantic_kernel.connectors.azure_ai_search import AzureAISearchCollection
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
 from semantic_kernel.connectors.openapi_plugin import OpenAPIFunctionExecutionParameters
 from semantic_kernel.connectors.ai.open_ai import AzureTextEmbedding
 from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.utils.author_role import AuthorRole
 from semantic_kernel.functions import KernelArguments
 import os
 from pathlib import Path
+import httpx
+from semantic_kernel.connectors.ai.embedding_generator_base import EmbeddingGeneratorBase
+from semantic_kernel.contents import FunctionCallContent
+from semantic_kernel.exceptions import KernelServiceNotFoundError
+from semantic_kernel.filters import FilterTypes
 
+from history_reducer import TokenBudgetChatHistory
+from response_cache import ResponseCache
+from tool_calls import ToolCallScheduler
+from sessions import SessionPool
+from plugin_loading import lazy_plugin, load_openapi_spec, startup_timer
 from plugins.ai_search_plugin import AiSearchPlugin
 from plugins.geo_coding_plugin import GeoPlugin
 # Challenge 03 - Import plugins you create
@@ -27,35 +40,50 @@ logger = logging.getLogger(__name__)
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path, override=True)
 
-# Direct console output that will always be visible
-print("============ ENVIRONMENT VARIABLES ============")
-print(f"Using .env from: {env_path}")
-print(f"File exists: {env_path.exists()}")
-print(f"AZURE_OPENAI_CHAT_DEPLOYMENT_NAME: {os.environ.get('AZURE_OPENAI_CHAT_DEPLOYMENT_NAME')}")
-print(f"AZURE_OPENAI_ENDPOINT: {os.environ.get('AZURE_OPENAI_ENDPOINT')}")
-print(f"AZURE_OPENAI_API_KEY: {'*****' if os.environ.get('AZURE_OPENAI_API_KEY') else 'Not found'}")
-print(f"GEOCODING_API_KEY: {'*****' if os.environ.get('GEOCODING_API_KEY') else 'Not found'}")
-print(f"AZURE_OPENAI_API_VERSION: {os.environ.get('AZURE_OPENAI_API_VERSION')}")
-print(f"AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME: {os.environ.get('AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME')}")
-print(f"AZURE_AI_SEARCH_ENDPOINT: {os.environ.get('AZURE_AI_SEARCH_ENDPOINT')}")
-print(f"AZURE_AI_SEARCH_API_KEY: {'*****' if os.environ.get('AZURE_AI_SEARCH_API_KEY') else 'Not found'}")
-print(f"AZURE_AI_SEARCH_INDEX_NAME: {os.environ.get('AZURE_AI_SEARCH_INDEX_NAME')}")
-print(f"AZURE_OPENAI_TEXT_TO_IMAGE_DEPLOYMENT_NAME: {os.environ.get('AZURE_OPENAI_TEXT_TO_IMAGE_DEPLOYMENT_NAME')}")
-print("==============================================")
+def print_environment():
+    """Direct console output that will always be visible, printed once when the chat service is created"""
+    print("============ ENVIRONMENT VARIABLES ============")
+    print(f"Using .env from: {env_path}")
+    print(f"File exists: {env_path.exists()}")
+    print(f"AZURE_OPENAI_CHAT_DEPLOYMENT_NAME: {os.environ.get('AZURE_OPENAI_CHAT_DEPLOYMENT_NAME')}")
+    print(f"AZURE_OPENAI_ENDPOINT: {os.environ.get('AZURE_OPENAI_ENDPOINT')}")
+    print(f"AZURE_OPENAI_API_KEY: {'*****' if os.environ.get('AZURE_OPENAI_API_KEY') else 'Not found'}")
+    print(f"GEOCODING_API_KEY: {'*****' if os.environ.get('GEOCODING_API_KEY') else 'Not found'}")
+    print(f"AZURE_OPENAI_API_VERSION: {os.environ.get('AZURE_OPENAI_API_VERSION')}")
+    print(f"AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME: {os.environ.get('AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME')}")
+    print(f"AZURE_AI_SEARCH_ENDPOINT: {os.environ.get('AZURE_AI_SEARCH_ENDPOINT')}")
+    print(f"AZURE_AI_SEARCH_API_KEY: {'*****' if os.environ.get('AZURE_AI_SEARCH_API_KEY') else 'Not found'}")
+    print(f"AZURE_AI_SEARCH_INDEX_NAME: {os.environ.get('AZURE_AI_SEARCH_INDEX_NAME')}")
+    print(f"AZURE_OPENAI_TEXT_TO_IMAGE_DEPLOYMENT_NAME: {os.environ.get('AZURE_OPENAI_TEXT_TO_IMAGE_DEPLOYMENT_NAME')}")
+    print("==============================================")
+
+WORKITEMS_API_URL = os.environ.get("WORKITEMS_API_URL", "http://127.0.0.1:8001")
 
 class ChatService:
     """Chat service class that initializes kernel and plugins once, then processes messages efficiently"""
     
     def __init__(self):
-        self.chat_history = ChatHistory()
+        print_environment()
         self.kernel = None
         self.chat_completion_service = None
         self.initialize_kernel()
+        self.chat_history = self.create_chat_history()
+        self._workitems_client = None
+        self.response_cache = self.create_response_cache()
+        # Tool calls the model requests together run concurrently, bounded per turn and timed
+        self.tool_calls = ToolCallScheduler(
+            max_concurrency=int(os.environ.get("CHAT_TOOL_CONCURRENCY", 4)),
+            timeout_seconds=float(os.environ.get("CHAT_TOOL_TIMEOUT_SECONDS", 30)),
+        )
+        self.last_tool_calls = None
+        if self.kernel is not None:
+            self.kernel.add_filter(FilterTypes.AUTO_FUNCTION_INVOCATION, self.tool_calls.invoke)
     
     def initialize_kernel(self):
         """Initialize kernel and load all plugins once during construction"""
         print("Initializing kernel and loading plugins...")
-        
+        services_started = time.perf_counter()
+
         # Challenge 02 - Add Kernel
         # TODO: Create a new Kernel instance and assign it to self.kernel
         
@@ -75,37 +103,40 @@ class ChatService:
         # text_to_image_service = AzureTextToImage()
         # self.kernel.add_service(text_to_image_service)
 
-        # Load all plugins once during kernel initialization
-        self.load_plugins()
-        print("Kernel initialization complete.")
+        startup_timer.record("kernel and services", time.perf_counter() - services_started)
+
+        # Load all plugins once during kernel initialization. Plugins wrapped in lazy_plugin
+        # only register their function descriptions here and are created on first use
+        with startup_timer.phase("plugins"):
+            self.load_plugins()
+        print(f"Kernel initialization complete in {startup_timer.report()}.")
 
     def load_plugins(self):
         """Helper method to centralize plugin loading logic"""
         # Challenge 03 - Add Time Plugin
-        # timePlugin = TimePlugin()
-        # self.kernel.add_plugin(timePlugin)
+        # self.kernel.add_plugin(lazy_plugin(TimePlugin))
 
         # Challenge 03 - Add Geo Plugin
-        # geo_plugin = GeoPlugin()
-        # self.kernel.add_plugin(geo_plugin)
+        # self.kernel.add_plugin(lazy_plugin(GeoPlugin))
 
         # Challenge 03 - Add Weather Plugin
-        # self.kernel.add_plugin(WeatherPlugin())
+        # self.kernel.add_plugin(lazy_plugin(WeatherPlugin))
 
         # Challenge 04 - Import OpenAPI Spec
+        # The parsed spec is cached on disk, so later starts don't fetch and resolve it again
         # self.kernel.add_plugin_from_openapi(
         #     plugin_name="workitems",
-        #     openapi_document_path="http://127.0.0.1:8001/openapi.json",
+        #     openapi_parsed_spec=load_openapi_spec("http://127.0.0.1:8001/openapi.json"),
         #     execution_settings=OpenAPIFunctionExecutionParameters(
-        #         enable_payload_namespacing=True)
+        #         enable_payload_namespacing=True,
+        #         server_url_override="http://127.0.0.1:8001")
         # )
         
         # Challenge 05 - Add Search Plugin
-        # search_plugin = AiSearchPlugin(kernel=self.kernel)
-        # self.kernel.add_plugin(search_plugin)
+        # self.kernel.add_plugin(lazy_plugin(AiSearchPlugin, lambda: AiSearchPlugin(kernel=self.kernel)))
         
         # Challenge 07 - Text To Image Plugin
-        # self.kernel.add_plugin(ImagePlugin(kernel=self.kernel))
+        # self.kernel.add_plugin(lazy_plugin(ImagePlugin, lambda: ImagePlugin(kernel=self.kernel)))
         
         pass
 
@@ -113,21 +144,149 @@ class ChatService:
         """Process a message using the pre-initialized kernel and plugins"""
         # Start Challenge 02 - Sending a message to the chat completion service by invoking kernel
         # TODO: Implement the following steps:
-        # 1. Add the user's message to the chat history
+        # 1. Add the user's message to the chat history and reduce it (await self.chat_history.reduce())
         # 2. Create execution settings with function choice behavior set to Auto
         # 3. Get a response from the chat completion service
         # 4. Add the AI's response to the chat history  
         # 5. Return the AI response
         
         # Hint: Use self.chat_history, self.chat_completion_service, and self.kernel
+        # Hint: Get the response inside "with self.tool_call_turn():" so the tool calls the
+        # model requests are bounded, timed out and recorded in self.last_tool_calls
         # See: https://learn.microsoft.com/en-us/semantic-kernel/concepts/ai-services/chat-completion/?tabs=python-AzureOpenAI&pivots=programming-language-python#using-chat-completion-services
         # See: https://learn.microsoft.com/en-us/semantic-kernel/concepts/ai-services/chat-completion/chat-history?pivots=programming-language-python#creating-a-chat-history-object
         
         pass  # Remove this line when you implement the function
 
+    async def process_message_stream(self, user_input):
+        """Process a message like process_message, yielding the response text as it is generated
+
+        The UI uses it instead of process_message when CHAT_STREAMING=true. With auto function
+        calling the model may answer in several rounds: Semantic Kernel invokes the requested
+        functions between rounds and streams the next one, so text is yielded across all of
+        them while tool calls and results are kept out of the output.
+        """
+        # Only standalone questions are cached, a follow-up depends on the turns before it
+        cacheable = self.response_cache is not None and not any(
+            message.role == AuthorRole.USER for message in self.chat_history.messages
+        )
+        if cacheable:
+            cached_response = await self.response_cache.get(user_input)
+            if cached_response is not None:
+                self.chat_history.add_user_message(user_input)
+                self.chat_history.add_assistant_message(cached_response)
+                yield cached_response
+                return
+
+        self.chat_history.add_user_message(user_input)
+        await self.chat_history.reduce()
+        turn_start = len(self.chat_history.messages)
+        execution_settings = AzureChatPromptExecutionSettings(
+            function_choice_behavior=FunctionChoiceBehavior.Auto(),
+            parallel_tool_calls=self.tool_calls.max_concurrency > 1,
+        )
+
+        # Text of the current round; a round that ends in tool calls is added to the
+        # history by Semantic Kernel itself, only the final answer is left to add here
+        answer = []
+        with self.tool_call_turn():
+            async for messages in self.chat_completion_service.get_streaming_chat_message_contents(
+                chat_history=self.chat_history,
+                settings=execution_settings,
+                kernel=self.kernel,
+            ):
+                for message in messages:
+                    if message.role == AuthorRole.TOOL:
+                        answer = []
+                    elif message.content:
+                        answer.append(message.content)
+                        yield message.content
+
+        self.chat_history.add_assistant_message("".join(answer))
+
+        if cacheable and answer:
+            function_calls = [
+                item for message in self.chat_history.messages[turn_start:]
+                for item in message.items if isinstance(item, FunctionCallContent)
+            ]
+            if self._is_cacheable_turn(function_calls):
+                await self.response_cache.put(
+                    user_input, "".join(answer), tags={call.plugin_name for call in function_calls}
+                )
+
+    @contextmanager
+    def tool_call_turn(self):
+        """Bound and time the tool calls made while answering one message, keeping them in last_tool_calls"""
+        self.tool_calls.start_turn(self.chat_history)
+        try:
+            yield
+        finally:
+            self.last_tool_calls = self.tool_calls.finish_turn(self.chat_history)
+
+    def supports_streaming(self):
+        """Stream responses only when CHAT_STREAMING is enabled, once Challenge 02 is complete
+
+        Otherwise the UI calls process_message, the method Challenge 02 asks you to implement.
+        """
+        return (
+            os.environ.get("CHAT_STREAMING", "false").lower() == "true"
+            and self.chat_completion_service is not None
+        )
+
+    def create_chat_history(self):
+        """Create an empty chat history that summarizes older turns once it exceeds its token budget"""
+        return TokenBudgetChatHistory(
+            token_budget=int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", 8000)),
+            service=self.chat_completion_service,
+        )
+
+    def create_response_cache(self):
+        """Create the response cache shared by all sessions if CHAT_RESPONSE_CACHE is enabled"""
+        if os.environ.get("CHAT_RESPONSE_CACHE", "false").lower() != "true" or self.kernel is None:
+            return None
+        try:
+            # With an embedding service (Challenge 05) rephrased questions match too
+            embedding_service = self.kernel.get_service(type=EmbeddingGeneratorBase)
+        except KernelServiceNotFoundError:
+            embedding_service = None
+        response_cache = ResponseCache(
+            embedding_service=embedding_service,
+            similarity_threshold=float(os.environ.get("CHAT_RESPONSE_CACHE_SIMILARITY", 0.95)),
+            ttl_seconds=float(os.environ.get("CHAT_RESPONSE_CACHE_TTL_SECONDS", 3600)),
+            max_entries=int(os.environ.get("CHAT_RESPONSE_CACHE_MAX_ENTRIES", 1000)),
+        )
+        if "workitems" in self.kernel.plugins:
+            response_cache.add_invalidation_source("workitems", self._workitems_version)
+        return response_cache
+
+    def _is_cacheable_turn(self, function_calls):
+        """A turn can be cached unless it used a time-dependent plugin or an API call that changes data"""
+        skip_plugins = os.environ.get("CHAT_RESPONSE_CACHE_SKIP_PLUGINS", "TimePlugin,WeatherPlugin,ImagePlugin")
+        for function_call in function_calls:
+            if function_call.plugin_name in skip_plugins.split(","):
+                return False
+            function = self.kernel.get_function(function_call.plugin_name, function_call.function_name)
+            if (function.metadata.additional_properties or {}).get("method", "GET") != "GET":
+                return False
+        return True
+
+    async def _workitems_version(self):
+        """The work item store version, from the ETag the Work Items API puts on /workitemtypes"""
+        if self._workitems_client is None:
+            self._workitems_client = httpx.AsyncClient(base_url=WORKITEMS_API_URL, timeout=2)
+        response = await self._workitems_client.get("/workitemtypes")
+        response.raise_for_status()
+        return response.headers.get("ETag")
+
     def reset_chat_history(self):
         """Reset the chat history"""
-        self.chat_history = ChatHistory()
+        self.chat_history = self.create_chat_history()
+
+    def new_session(self):
+        """Return a ChatService with its own chat history that shares this one's kernel, services and plugins"""
+        session = copy.copy(self)
+        session.chat_history = self.create_chat_history()
+        return session
 
 # Global instance - initialized once when module is imported
 _chat_service = None
@@ -139,6 +298,24 @@ def get_chat_service():
         _chat_service = ChatService()
     return _chat_service
 
+# Per-session chat services - created lazily from the singleton
+_chat_sessions = None
+
+def get_chat_sessions():
+    """Get the pool of per-session chat services"""
+    global _chat_sessions
+    if _chat_sessions is None:
+        chat_service = get_chat_service()
+        _chat_sessions = SessionPool(
+            chat_service.new_session,
+            max_sessions=int(os.environ.get("CHAT_MAX_SESSIONS", 1000)),
+            ttl_seconds=float(os.environ.get("CHAT_SESSION_TTL_SECONDS", 3600)),
+            # Chat histories dominate session memory, so the cap is on their tokens
+            size=lambda session: session.chat_history.token_count(),
+            max_total_size=int(os.environ.get("CHAT_SESSIONS_MAX_TOKENS", 10_000_000)),
+        )
+    return _chat_sessions
+
 # Legacy functions for backward compatibility
 async def process_message(user_input):
     """Legacy function - delegates to ChatService"""
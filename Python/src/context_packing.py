@@ -0,0 +1,83 @@
+from typing import Sequence
+
+from semantic_kernel.data.vector import VectorSearchResult
+
+from history_reducer import TokenCounter
+from ingest import SENTENCE_END
+from retrieval import tokenize
+
+
+def split_sentences(text: str) -> list[str]:
+    return [sentence for sentence in SENTENCE_END.split(" ".join(text.split())) if sentence]
+
+
+def extract_passage(query_terms: set[str], sentences: list[str], counter: TokenCounter, max_tokens: int) -> str:
+    """The sentences most relevant to the query that fit in max_tokens, in their original order.
+
+    Only sentences containing a query term are kept, ranked by how many they contain,
+    earlier first on ties; if none does, the passage is the opening sentences. Gaps between
+    kept sentences are marked with an ellipsis.
+    """
+    matches = [len(query_terms & set(tokenize(sentence))) for sentence in sentences]
+    ranked = sorted((index for index, match in enumerate(matches) if match), key=lambda index: (-matches[index], index))
+    if not ranked:
+        ranked = list(range(len(sentences)))
+    kept, used = [], 0
+    for index in ranked:
+        tokens = counter.count(sentences[index])
+        if used + tokens > max_tokens:
+            continue
+        kept.append(index)
+        used += tokens
+    if not kept and sentences:
+        return counter.clip(sentences[ranked[0]], max_tokens)
+    kept.sort()
+    passage = sentences[kept[0]]
+    for previous, index in zip(kept, kept[1:]):
+        passage += (" " if index == previous + 1 else " … ") + sentences[index]
+    return passage
+
+
+def pack_context(
+    query: str,
+    results: Sequence[VectorSearchResult],
+    counter: TokenCounter,
+    token_budget: int = 1200,
+    passage_tokens: int = 300,
+) -> str:
+    """Pack search results into a compact, cited context of at most token_budget tokens.
+
+    Results from the same source document (parent_id) are merged under one citation,
+    ranked by their best result. Sentences already packed from an overlapping chunk are
+    skipped, and each result contributes only its passage_tokens most relevant tokens.
+    Sources are numbered [1], [2], ... with their title and url so the answer can cite them.
+    """
+    query_terms = set(tokenize(query))
+    groups: dict[str, list[VectorSearchResult]] = {}
+    for result in results:
+        groups.setdefault(result.record.parent_id or result.record.chunk_id, []).append(result)
+
+    seen_sentences = set()
+    sections, used = [], 0
+    for group in groups.values():
+        passages = []
+        for result in group:
+            sentences = [sentence for sentence in split_sentences(result.record.content or "") if sentence not in seen_sentences]
+            if not sentences:
+                continue
+            passage = extract_passage(query_terms, sentences, counter, passage_tokens)
+            seen_sentences.update(sentence for sentence in sentences if sentence in passage)
+            passages.append(passage)
+        if not passages:
+            continue
+        record = group[0].record
+        section = f"[{len(sections) + 1}] {record.title} ({record.url or record.filepath})\n" + "\n".join(passages)
+        tokens = counter.count(section)
+        if used + tokens > token_budget:
+            if sections:
+                continue
+            section = counter.clip(section, token_budget)
+            tokens = token_budget
+        sections.append(section)
+        used += tokens
+    return "\n\n".join(sections)
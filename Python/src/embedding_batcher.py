@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests into batched calls.
+
+    Each embed() call joins a pending batch; the batch is sent as one
+    generate([...]) call once it holds max_batch_size texts or max_wait_seconds
+    after its first text arrived, whichever comes first, and every caller gets
+    its own vector back. Identical texts in a batch are embedded once, and if
+    the call fails every caller in the batch gets the exception.
+
+    A lone request waits at most max_wait_seconds longer than it would on its
+    own; under concurrent load many requests share one round trip and count
+    once against the endpoint's request rate limit.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[list[str]], Awaitable[Sequence[Sequence[float]]]],
+        max_batch_size: int = 16,
+        max_wait_seconds: float = 0.005,
+    ):
+        self._generate = generate
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        # Batches in flight, referenced so they are not garbage collected while running
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, text: str) -> Sequence[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_seconds, self._flush)
+        return await future
+
+    async def embed_many(self, texts: Sequence[str]) -> list[Sequence[float]]:
+        """Embed several texts, sharing batches with any other concurrent callers"""
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]):
+        texts = list(dict.fromkeys(text for text, future in batch if not future.done()))
+        if not texts:
+            return
+        self.batches += 1
+        self.texts += len(texts)
+        try:
+            vectors = await self._generate(texts)
+            # A short result would leave some callers without a vector, waiting forever
+            if len(vectors) != len(texts):
+                raise ValueError(f"Embedding service returned {len(vectors)} vectors for {len(texts)} texts")
+            vectors = dict(zip(texts, vectors))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future in batch:
+            if not future.done():
+                future.set_result(vectors[text])
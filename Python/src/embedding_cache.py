@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Sequence
+
+import numpy as np
+
+from caching import WHITESPACE, open_cache_database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path(__file__).parent / ".cache" / "embeddings.db"
+SCHEMA = "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize the text and collapse whitespace; case is kept since it can change the embedding"""
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+@dataclass
+class EmbeddingCacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+class EmbeddingCache:
+    """Two-tier cache of text embeddings: an in-memory LRU in front of a SQLite file.
+
+    Entries are keyed by a hash of the embedding model (deployment) name and the
+    normalized text, so switching deployments never returns vectors from another
+    model. Vectors are kept as float32, in memory as arrays and on disk as raw
+    4-byte-per-dimension blobs, which is a quarter of their size as JSON floats
+    and is read back without parsing. With path None, or a file that cannot be
+    opened, only the in-memory tier is used.
+    """
+
+    def __init__(self, model: str, path: str | Path | None = DEFAULT_CACHE_PATH, max_memory_entries: int = 10000):
+        self.model = model
+        self.max_memory_entries = max_memory_entries
+        self.stats = EmbeddingCacheStats()
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = open_cache_database(path, SCHEMA, "Embedding cache")
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{normalize_text(text)}".encode()).hexdigest()
+
+    def get(self, text: str) -> np.ndarray | None:
+        key = self.key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return vector
+            if self._conn is not None:
+                row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.stats.disk_hits += 1
+                    return vector
+            self.stats.misses += 1
+            return None
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes()))
+            if self._conn is not None:
+                try:
+                    with self._conn:
+                        self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not write embeddings to the cache file: {e}")
+
+    async def get_or_create(
+        self, texts: Sequence[str], generate: Callable[[list[str]], Awaitable[Sequence[Sequence[float]]]]
+    ) -> list[np.ndarray]:
+        """Return embeddings for texts, calling generate once with only the texts that are not cached"""
+        vectors = [self.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            generated = await generate(missing)
+            self.put_many(missing, generated)
+            created = {text: np.asarray(vector, dtype=np.float32) for text, vector in zip(missing, generated)}
+            vectors = [vector if vector is not None else created[text] for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _remember(self, key: str, vector: np.ndarray):
+        # Cached arrays are handed out as they are, so callers must not be able to change them
+        vector.setflags(write=False)
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+
+def embedding_cache_for(deployment: str | None) -> EmbeddingCache:
+    """Create an embedding cache for a deployment, configured from the environment.
+
+    EMBEDDING_CACHE_PATH selects the cache file ("" disables the disk tier) and
+    EMBEDDING_CACHE_MEMORY_ENTRIES the size of the in-memory tier.
+    """
+    path = os.environ.get("EMBEDDING_CACHE_PATH", str(DEFAULT_CACHE_PATH))
+    return EmbeddingCache(
+        model=deployment or "default",
+        path=path or None,
+        max_memory_entries=int(os.environ.get("EMBEDDING_CACHE_MEMORY_ENTRIES", 10000)),
+    )
@@ -0,0 +1,76 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+from caching import WHITESPACE, open_cache_database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path(__file__).parent / ".cache" / "geocoding.db"
+SCHEMA = "CREATE TABLE IF NOT EXISTS locations (key TEXT PRIMARY KEY, lat TEXT NOT NULL, lon TEXT NOT NULL, stored REAL NOT NULL)"
+
+
+def normalize_location(location: str) -> str:
+    """Case-fold, Unicode-normalize and collapse whitespace and edge punctuation, so "Paris, France " and "paris,  france" share an entry"""
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFKC", location).casefold()).strip(" .,;")
+
+
+class GeocodingCache:
+    """Cache of location -> (latitude, longitude) in a SQLite file, with entries expiring after ttl_seconds.
+
+    Coordinates of a place do not change, so the TTL only bounds how long a wrong
+    or ambiguous match from the geocoding service is kept. With path None, or a
+    file that cannot be opened, the cache is in memory only.
+    """
+
+    def __init__(self, path: str | Path | None = DEFAULT_CACHE_PATH, ttl_seconds: float = 30 * 86400):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = open_cache_database(path, SCHEMA, "Geocoding cache")
+        if self._conn is None:
+            self._conn = open_cache_database(":memory:", SCHEMA, "Geocoding cache")
+
+    def get(self, location: str) -> tuple[str, str] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lat, lon FROM locations WHERE key = ? AND stored > ?",
+                (normalize_location(location), time.time() - self.ttl_seconds),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], row[1]
+
+    def put(self, location: str, lat: str, lon: str):
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO locations (key, lat, lon, stored) VALUES (?, ?, ?, ?)",
+                        (normalize_location(location), str(lat), str(lon), time.time()),
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Could not write to the geocoding cache: {e}")
+
+    def close(self):
+        self._conn.close()
+
+
+def geocoding_cache_from_env() -> GeocodingCache:
+    """Create the geocoding cache configured from the environment.
+
+    GEOCODING_CACHE_PATH selects the cache file ("" keeps it in memory) and
+    GEOCODING_CACHE_TTL_SECONDS how long entries are kept.
+    """
+    path = os.environ.get("GEOCODING_CACHE_PATH", str(DEFAULT_CACHE_PATH))
+    return GeocodingCache(
+        path=path or None,
+        ttl_seconds=float(os.environ.get("GEOCODING_CACHE_TTL_SECONDS", 30 * 86400)),
+    )
@@ -0,0 +1,212 @@
+import logging
+import sys
+
+if sys.version < "3.12":
+    from typing_extensions import override
+else:
+    from typing import override
+
+from pydantic import Field, PrivateAttr
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import ChatMessageContent, FunctionCallContent, FunctionResultContent
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.history_reducer.chat_history_reducer import ChatHistoryReducer
+from semantic_kernel.contents.history_reducer.chat_history_reducer_utils import SUMMARY_METADATA_KEY
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Tokens every message costs on top of its content (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARIZATION_PROMPT = """
+Update the summary of the conversation below with the new messages that follow it.
+Keep the facts, names, IDs, numbers and decisions needed to continue the conversation,
+including the key results of any tool calls. Answer with the summary only, at most 10 sentences.
+"""
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when it is installed, otherwise estimates about 4 characters per token"""
+
+    def __init__(self, encoding_name: str = "o200k_base"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:
+                logger.warning(f"tiktoken encoding {encoding_name} unavailable, estimating tokens: {e}")
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def clip(self, text: str, max_tokens: int) -> str:
+        """Cut text down to roughly max_tokens tokens"""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return self._encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * 4]
+
+
+class TokenBudgetChatHistory(ChatHistoryReducer):
+    """A ChatHistory that keeps the prompt within a token budget.
+
+    reduce() leaves the history alone while it fits the budget. Once it does not:
+    1. Tool results of earlier turns (search hits, work item dumps, ...) larger than
+       max_tool_result_tokens are clipped; the answers built from them are kept.
+    2. If that is not enough, the oldest turns are folded into a rolling summary
+       message, keeping the leading system messages and the most recent turns
+       verbatim. Turns are only split at user messages, so function calls are never
+       separated from their results.
+    If there is no service to summarize with, or summarization fails, the oldest
+    turns are dropped instead.
+
+    Token counts are cached per message, so each reduce() only tokenizes the
+    messages added since the last one.
+    """
+
+    target_count: int = Field(default=1, gt=0, description="Recent messages that are always kept verbatim.")
+    token_budget: int = Field(default=8000, gt=0, description="Token budget for the whole history.")
+    max_tool_result_tokens: int = Field(default=500, gt=0, description="Size tool results of earlier turns are clipped to.")
+    summary_tokens: int = Field(default=500, gt=0, description="Tokens reserved for the rolling summary.")
+    service: ChatCompletionClientBase | None = None
+    execution_settings: PromptExecutionSettings | None = None
+
+    _counter: TokenCounter = PrivateAttr(default_factory=TokenCounter)
+    # id(message) -> (message, token count); the message is held so its id cannot be reused
+    _token_counts: dict[int, tuple[ChatMessageContent, int]] = PrivateAttr(default_factory=dict)
+
+    def token_count(self) -> int:
+        """Tokens of the whole history, tokenizing only messages that are not counted yet"""
+        counts = {}
+        total = 0
+        for message in self.messages:
+            cached = self._token_counts.get(id(message))
+            count = cached[1] if cached and cached[0] is message else self._count(message)
+            counts[id(message)] = (message, count)
+            total += count
+        self._token_counts = counts
+        return total
+
+    @override
+    async def reduce(self):
+        if self.token_count() <= self.token_budget:
+            return None
+
+        last_user = self._last_user_index()
+        self._clip_tool_results(end=last_user)
+        if self.token_count() <= self.token_budget:
+            return self
+
+        head, summary = self._head()
+        split = self._split_index(start=head + (summary is not None), budget=self.token_budget - self.summary_tokens)
+        if split is None:
+            return self
+
+        older = self.messages[head + (summary is not None):split]
+        new_summary = await self._summarize(summary, older)
+        kept = self.messages[:head] + ([new_summary] if new_summary else []) + self.messages[split:]
+        logger.info(f"Reduced chat history from {len(self.messages)} to {len(kept)} messages")
+        self.messages = kept
+        self.token_count()
+        return self
+
+    def _count(self, message: ChatMessageContent) -> int:
+        return self._counter.count(_message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+
+    def _last_user_index(self) -> int:
+        for index in range(len(self.messages) - 1, -1, -1):
+            if self.messages[index].role == AuthorRole.USER:
+                return index
+        return len(self.messages)
+
+    def _clip_tool_results(self, end: int):
+        for message in self.messages[:end]:
+            for item in message.items:
+                if not isinstance(item, FunctionResultContent):
+                    continue
+                result = str(item.result)
+                if self._counter.count(result) > self.max_tool_result_tokens:
+                    item.result = self._counter.clip(result, self.max_tool_result_tokens) + "\n[truncated]"
+                    self._token_counts.pop(id(message), None)
+
+    def _head(self) -> tuple[int, ChatMessageContent | None]:
+        """Return the number of leading system messages and the summary message that follows them, if any"""
+        head = 0
+        while (
+            head < len(self.messages)
+            and self.messages[head].role in (AuthorRole.SYSTEM, AuthorRole.DEVELOPER)
+            and not self.messages[head].metadata.get(SUMMARY_METADATA_KEY)
+        ):
+            head += 1
+        if head < len(self.messages) and self.messages[head].metadata.get(SUMMARY_METADATA_KEY):
+            return head, self.messages[head]
+        return head, None
+
+    def _split_index(self, start: int, budget: int) -> int | None:
+        """Return the index of the oldest user message from which the rest of the history fits the budget"""
+        remaining = budget - sum(
+            self._token_counts[id(message)][1]
+            for message in self.messages[:start]
+            if not message.metadata.get(SUMMARY_METADATA_KEY)
+        )
+        users = [index for index in range(start, len(self.messages)) if self.messages[index].role == AuthorRole.USER]
+        if not users:
+            return None
+        # The most recent turn and at least target_count messages are always kept, even over budget
+        split = max((index for index in users if index <= len(self.messages) - self.target_count), default=users[0])
+        kept = sum(self._token_counts[id(message)][1] for message in self.messages[split:])
+        for index in range(split - 1, start - 1, -1):
+            kept += self._token_counts[id(self.messages[index])][1]
+            if kept > remaining:
+                break
+            if self.messages[index].role == AuthorRole.USER:
+                split = index
+        return split if split > start else None
+
+    async def _summarize(self, summary: ChatMessageContent | None, messages: list[ChatMessageContent]) -> ChatMessageContent | None:
+        if self.service is None:
+            return summary
+        transcript = "\n".join(
+            f"{message.role.value}: {self._counter.clip(_message_text(message), self.max_tool_result_tokens)}"
+            for message in messages
+        )
+        chat_history = ChatHistory()
+        chat_history.add_system_message(SUMMARIZATION_PROMPT)
+        chat_history.add_user_message(
+            f"Current summary:\n{summary.content.removeprefix(SUMMARY_PREFIX) if summary else '(none)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        settings = self.execution_settings or self.service.get_prompt_execution_settings_class()()
+        try:
+            response = await self.service.get_chat_message_content(chat_history=chat_history, settings=settings)
+        except Exception as e:
+            logger.warning(f"Chat history summarization failed, dropping the oldest turns instead: {e}")
+            return summary
+        if response is None or not response.content:
+            return summary
+        return ChatMessageContent(
+            role=AuthorRole.SYSTEM,
+            content=SUMMARY_PREFIX + self._counter.clip(response.content, self.summary_tokens),
+            metadata={SUMMARY_METADATA_KEY: True},
+        )
+
+
+def _message_text(message: ChatMessageContent) -> str:
+    parts = [message.content] if message.content else []
+    for item in message.items:
+        if isinstance(item, FunctionCallContent):
+            parts.append(f"{item.name}({item.arguments or ''})")
+        elif isinstance(item, FunctionResultContent):
+            parts.append(str(item.result))
+    return "\n".join(parts)
@@ -0,0 +1,344 @@
+"""Ingestion pipeline for the employee handbook search index.
+
+Reads the documents in a directory (.pdf, .md, .txt), splits them into chunks,
+embeds the chunks and upserts them as EmployeeHandbookModel records into the
+collection AiSearchPlugin searches: Azure AI Search, or the local index when
+HANDBOOK_VECTOR_STORE=local.
+
+    python ingest.py data
+    python ingest.py data --chunk-tokens 400 --overlap-tokens 50
+    python ingest.py data --full
+
+Runs are incremental. A manifest under .cache/ingest records a hash of every
+chunk that was indexed, so unchanged chunks are neither embedded nor upserted
+again, and chunks of edited or deleted documents that no longer exist are
+deleted from the collection. --full reindexes every chunk, changed or not.
+Reading PDFs needs the pypdf package.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Iterator, Sequence
+
+from dotenv import load_dotenv
+from semantic_kernel.connectors.ai.open_ai import AzureTextEmbedding
+
+from embedding_cache import embedding_cache_for
+from history_reducer import TokenCounter
+from models.employee_handbook_model import EmployeeHandbookModel
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_DIR = Path(__file__).parent / ".cache" / "ingest"
+DOCUMENT_SUFFIXES = (".pdf", ".md", ".txt")
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class SourceDocument:
+    path: Path
+    relative_path: str
+    title: str
+    text: str
+
+
+@dataclass
+class Chunk:
+    chunk_id: str
+    parent_id: str
+    title: str
+    content: str
+    url: str
+    filepath: str
+
+    @property
+    def content_hash(self) -> str:
+        return hashlib.sha256(f"{self.title}\n{self.content}".encode()).hexdigest()
+
+
+def read_documents(directory: Path) -> Iterator[SourceDocument]:
+    """Yield the documents under directory one at a time, so only one is in memory"""
+    for path in sorted(directory.rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in DOCUMENT_SUFFIXES:
+            continue
+        text = read_pdf(path) if path.suffix.lower() == ".pdf" else path.read_text(encoding="utf-8")
+        title = path.stem.replace("_", " ").replace("-", " ").strip().capitalize()
+        yield SourceDocument(path=path, relative_path=path.relative_to(directory).as_posix(), title=title, text=text)
+
+
+def read_pdf(path: Path) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise RuntimeError("Reading PDF documents needs the pypdf package: pip install pypdf") from e
+    return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+
+
+def split_text(text: str, counter: TokenCounter, max_tokens: int, overlap_tokens: int) -> list[str]:
+    """Split text into chunks of at most max_tokens tokens, breaking at paragraphs, then sentences.
+
+    Each chunk after the first starts with up to overlap_tokens tokens of the sentences
+    before it, so a passage cut at a chunk boundary is still whole in one of the two.
+    """
+    pieces = []
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if counter.count(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_END.split(paragraph):
+            # A single sentence longer than a chunk is cut at max_tokens
+            while counter.count(sentence) > max_tokens:
+                head = counter.clip(sentence, max_tokens)
+                pieces.append(head)
+                sentence = sentence[len(head):].strip()
+            if sentence:
+                pieces.append(sentence)
+
+    chunks, current, current_tokens = [], [], 0
+    for piece in pieces:
+        tokens = counter.count(piece)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(current))
+            # Carry the last pieces of this chunk over as the overlap of the next
+            overlap, overlap_count = [], 0
+            for previous in reversed(current):
+                previous_tokens = counter.count(previous)
+                if overlap_count + previous_tokens > overlap_tokens or overlap_count + previous_tokens + tokens > max_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_count += previous_tokens
+            current, current_tokens = overlap, overlap_count
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def chunk_document(document: SourceDocument, counter: TokenCounter, max_tokens: int, overlap_tokens: int) -> list[Chunk]:
+    """Chunks of a document, with a parent_id derived from its path and chunk_ids numbered within it"""
+    parent_id = hashlib.sha256(document.relative_path.encode()).hexdigest()[:32]
+    return [
+        Chunk(
+            chunk_id=f"{parent_id}_{index}",
+            parent_id=parent_id,
+            title=document.title,
+            content=content,
+            url=document.path.resolve().as_uri(),
+            filepath=document.relative_path,
+        )
+        for index, content in enumerate(split_text(document.text, counter, max_tokens, overlap_tokens))
+    ]
+
+
+async def with_retries(call: Callable[[], Awaitable], attempts: int = 5, base_delay: float = 1.0):
+    """Await call(), retrying failures with exponential backoff and jitter"""
+    for attempt in range(1, attempts + 1):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            delay = base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            logger.warning(f"Attempt {attempt} of {attempts} failed, retrying in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+
+
+def create_collection():
+    """The collection AiSearchPlugin searches, selected by HANDBOOK_VECTOR_STORE"""
+    if os.environ.get("HANDBOOK_VECTOR_STORE", "azure").lower() == "local":
+        from local_vector_store import local_handbook_collection
+        return local_handbook_collection()
+    from semantic_kernel.connectors.azure_ai_search import AzureAISearchCollection
+    return AzureAISearchCollection(record_type=EmployeeHandbookModel)
+
+
+class IngestionPipeline:
+    """Embeds and upserts the chunks of a stream of documents, skipping chunks that are already indexed.
+
+    Changed chunks (all chunks with force) are embedded in batches of
+    embedding_batch_size, with at most concurrency batches in flight and failed
+    batches retried with backoff, and upserted in batches of upsert_batch_size.
+    The manifest, mapping chunk_id to parent_id and content hash, is saved after
+    every upsert, so an interrupted run resumes where it stopped. Collections with
+    deferred_writes (the local store) are written once at the end of the run
+    instead; an interrupted run then writes nothing and is redone in full, with
+    the embeddings of already processed chunks coming from the embedding cache.
+    """
+
+    def __init__(
+        self,
+        collection,
+        generate: Callable[[list[str]], Awaitable[Sequence[Sequence[float]]]],
+        manifest_path: Path,
+        embedding_batch_size: int = 16,
+        concurrency: int = 4,
+        upsert_batch_size: int = 500,
+        force: bool = False,
+    ):
+        self.collection = collection
+        self.generate = generate
+        self.manifest_path = manifest_path
+        self.embedding_batch_size = embedding_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.force = force
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.manifest: dict[str, dict[str, str]] = {}
+        if manifest_path.exists():
+            with open(manifest_path) as file:
+                self.manifest = json.load(file)
+        self._defer_manifest = False
+        self.stats = {"documents": 0, "chunks": 0, "unchanged": 0, "upserted": 0, "deleted": 0}
+
+    async def run(self, documents: Iterator[SourceDocument], chunker: Callable[[SourceDocument], list[Chunk]]):
+        await self.collection.ensure_collection_exists()
+        # The local store rewrites its whole index on every write, so its changes are applied
+        # in one write at the end of the run, and the manifest is saved once after that
+        deferred_writes = getattr(self.collection, "deferred_writes", None)
+        if deferred_writes is None:
+            return await self._run(documents, chunker)
+        self._defer_manifest = True
+        try:
+            with deferred_writes():
+                await self._run(documents, chunker)
+        finally:
+            self._defer_manifest = False
+        self._save_manifest()
+        return self.stats
+
+    async def _run(self, documents: Iterator[SourceDocument], chunker: Callable[[SourceDocument], list[Chunk]]):
+        pending: list[Chunk] = []
+        seen_parents = set()
+        for document in documents:
+            chunks = chunker(document)
+            self.stats["documents"] += 1
+            self.stats["chunks"] += len(chunks)
+            if not chunks:
+                continue
+            parent_id = chunks[0].parent_id
+            seen_parents.add(parent_id)
+            for chunk in chunks:
+                if not self.force and self.manifest.get(chunk.chunk_id, {}).get("hash") == chunk.content_hash:
+                    self.stats["unchanged"] += 1
+                else:
+                    pending.append(chunk)
+            # A document that got shorter leaves chunk_ids behind that must be removed
+            current = {chunk.chunk_id for chunk in chunks}
+            await self._delete([chunk_id for chunk_id, entry in self.manifest.items() if entry["parent_id"] == parent_id and chunk_id not in current])
+            if len(pending) >= self.upsert_batch_size:
+                await self._upsert(pending)
+                pending = []
+        if pending:
+            await self._upsert(pending)
+        # Documents that were removed from the directory
+        await self._delete([chunk_id for chunk_id, entry in self.manifest.items() if entry["parent_id"] not in seen_parents])
+        return self.stats
+
+    async def _embed_batch(self, chunks: list[Chunk]) -> list[EmployeeHandbookModel]:
+        async with self._semaphore:
+            vectors = await with_retries(lambda: self.generate([chunk.content for chunk in chunks]))
+        return [
+            EmployeeHandbookModel.model_validate(dict(
+                chunk_id=chunk.chunk_id,
+                parent_id=chunk.parent_id,
+                title=chunk.title,
+                content=chunk.content,
+                url=chunk.url,
+                filepath=chunk.filepath,
+                contentVector=vector,
+            ))
+            for chunk, vector in zip(chunks, vectors)
+        ]
+
+    async def _upsert(self, chunks: list[Chunk]):
+        batches = [chunks[start:start + self.embedding_batch_size] for start in range(0, len(chunks), self.embedding_batch_size)]
+        records = [record for batch in await asyncio.gather(*(self._embed_batch(batch) for batch in batches)) for record in batch]
+        await with_retries(lambda: self.collection.upsert(records))
+        for chunk in chunks:
+            self.manifest[chunk.chunk_id] = {"parent_id": chunk.parent_id, "hash": chunk.content_hash}
+        self.stats["upserted"] += len(chunks)
+        if not self._defer_manifest:
+            self._save_manifest()
+        print(f"Upserted {len(chunks)} chunks")
+
+    async def _delete(self, chunk_ids: list[str]):
+        if not chunk_ids:
+            return
+        await with_retries(lambda: self.collection.delete(chunk_ids))
+        for chunk_id in chunk_ids:
+            del self.manifest[chunk_id]
+        self.stats["deleted"] += len(chunk_ids)
+        if not self._defer_manifest:
+            self._save_manifest()
+        print(f"Deleted {len(chunk_ids)} stale chunks")
+
+    def _save_manifest(self):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path.with_suffix(".tmp")
+        with open(temp_path, "w") as file:
+            json.dump(self.manifest, file)
+        os.replace(temp_path, self.manifest_path)
+
+
+def manifest_path_for(model: str) -> Path:
+    """One manifest per target collection and embedding model, so switching either reindexes"""
+    if os.environ.get("HANDBOOK_VECTOR_STORE", "azure").lower() == "local":
+        target = f"local:{Path(os.environ.get('HANDBOOK_LOCAL_INDEX_PATH', 'default')).resolve()}"
+    else:
+        target = f"azure:{os.environ.get('AZURE_AI_SEARCH_ENDPOINT')}:{os.environ.get('AZURE_AI_SEARCH_INDEX_NAME')}"
+    key = hashlib.sha256(f"{target}\n{model}".encode()).hexdigest()[:16]
+    return MANIFEST_DIR / f"{key}.json"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", type=Path, help="Directory of documents to index")
+    parser.add_argument("--chunk-tokens", type=int, default=512, help="Maximum tokens per chunk")
+    parser.add_argument("--overlap-tokens", type=int, default=64, help="Tokens of overlap between consecutive chunks")
+    parser.add_argument("--batch-size", type=int, default=int(os.environ.get("EMBEDDING_BATCH_SIZE", 16)), help="Chunks per embedding request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument("--upsert-batch-size", type=int, default=500, help="Records per upsert")
+    parser.add_argument("--full", action="store_true", help="Reindex every chunk, changed or not")
+    args = parser.parse_args()
+
+    load_dotenv(override=True)
+    logging.basicConfig(level=logging.INFO)
+    embedding_service = AzureTextEmbedding()
+    embedding_cache = embedding_cache_for(embedding_service.ai_model_id)
+    manifest_path = manifest_path_for(embedding_service.ai_model_id)
+    pipeline = IngestionPipeline(
+        collection=create_collection(),
+        # Chunks embedded by an earlier run, e.g. before --full, come from the embedding cache
+        generate=lambda texts: embedding_cache.get_or_create(texts, embedding_service.generate_embeddings),
+        manifest_path=manifest_path,
+        embedding_batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        upsert_batch_size=args.upsert_batch_size,
+        force=args.full,
+    )
+    counter = TokenCounter()
+    start = time.perf_counter()
+    stats = await pipeline.run(
+        read_documents(args.directory),
+        lambda document: chunk_document(document, counter, args.chunk_tokens, args.overlap_tokens),
+    )
+    print(
+        f"Indexed {stats['documents']} documents in {time.perf_counter() - start:.1f}s: {stats['chunks']} chunks, "
+        f"{stats['upserted']} upserted, {stats['unchanged']} unchanged, {stats['deleted']} deleted"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,383 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterable
+
+import numpy as np
+from semantic_kernel.data.vector import KernelSearchResults, VectorSearchResult
+
+from models.employee_handbook_model import EmployeeHandbookModel
+from retrieval import BM25Index, reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = Path(__file__).parent / ".cache" / "handbook_index"
+INDEX_KINDS = ("auto", "exact", "ivf")
+QUANTIZATIONS = ("none", "int8", "binary")
+# With "auto", corpora at least this large get an IVF index; below it exact search is fast enough
+IVF_MIN_ROWS = 20000
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so a dot product is their cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without sorting the whole array"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class IvfIndex:
+    """Inverted-file index: rows are clustered around centroids with k-means, and a query
+    only scores the rows of its n_probe nearest clusters.
+
+    Row IDs are stored grouped by cluster, so each cluster is a contiguous slice of
+    order, from offsets[i] to offsets[i + 1].
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: int | None = None, iterations: int = 10, seed: int = 0) -> "IvfIndex":
+        n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), size=min(n_lists, len(vectors)), replace=False)].copy()
+        for _ in range(iterations):
+            assignments = _nearest(vectors, centroids)
+            for list_id in range(len(centroids)):
+                members = vectors[assignments == list_id]
+                if len(members):
+                    centroids[list_id] = members.mean(axis=0)
+            centroids = normalize_rows(centroids)
+        assignments = _nearest(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+        return cls(centroids, order, offsets)
+
+    @classmethod
+    def load(cls, path: Path) -> "IvfIndex":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["order"], data["offsets"])
+
+    def save(self, path: Path):
+        np.savez(path, centroids=self.centroids, order=self.order, offsets=self.offsets)
+
+    def candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        lists = top_k(self.centroids @ query, n_probe)
+        return np.concatenate([self.order[self.offsets[list_id]:self.offsets[list_id + 1]] for list_id in lists])
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    # Chunked so the score matrix stays small for large corpora
+    return np.concatenate([
+        np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), chunk_size)
+    ])
+
+
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    """Number of set bits in each row of a uint8 matrix"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits).sum(axis=1, dtype=np.int32)
+    return np.unpackbits(bits, axis=1).sum(axis=1, dtype=np.int32)
+
+
+class QuantizedVectors:
+    """A compact in-memory copy of the index vectors, for a first, approximate scoring pass.
+
+    int8 stores each row as bytes scaled by the row's largest component (4x smaller than
+    float32) and scores with a dot product; binary stores the sign of each component as
+    one bit (32x smaller) and scores by the number of matching bits. The float32 vectors
+    stay memory-mapped on disk and are only read to rescore the best candidates.
+    """
+
+    def __init__(self, kind: str, codes: np.ndarray, scales: np.ndarray | None = None):
+        self.kind = kind
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def encode(cls, kind: str, vectors: np.ndarray, chunk_size: int = 16384) -> "QuantizedVectors":
+        chunks = [np.asarray(vectors[start:start + chunk_size]) for start in range(0, len(vectors), chunk_size)]
+        if kind == "binary":
+            return cls(kind, np.concatenate([np.packbits(chunk > 0, axis=1) for chunk in chunks]))
+        scales = np.concatenate([np.abs(chunk).max(axis=1) / 127 for chunk in chunks]).astype(np.float32)
+        scales[scales == 0] = 1
+        codes = np.concatenate([
+            np.round(chunk / scales[start:start + len(chunk), None]).astype(np.int8)
+            for start, chunk in zip(range(0, len(vectors), chunk_size), chunks)
+        ])
+        return cls(kind, codes, scales)
+
+    @classmethod
+    def load(cls, path: Path) -> "QuantizedVectors":
+        with np.load(path) as data:
+            return cls(str(data["kind"]), data["codes"], data["scales"] if "scales" in data else None)
+
+    def save(self, path: Path):
+        arrays = {"kind": np.array(self.kind), "codes": self.codes}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        np.savez(path, **arrays)
+
+    def scores(self, query: np.ndarray, rows: np.ndarray | None = None, chunk_size: int = 16384) -> np.ndarray:
+        """Approximate similarity of query to the given rows (default all); higher is more similar"""
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.kind == "binary":
+            # Count the bits that agree with the query's signs, chunked to bound the XOR temporaries
+            query_bits = np.packbits(query > 0)
+            return np.concatenate([
+                -_popcount(codes[start:start + chunk_size] ^ query_bits)
+                for start in range(0, len(codes), chunk_size)
+            ]) if len(codes) else np.empty(0, dtype=np.int32)
+        scales = self.scales if rows is None else self.scales[rows]
+        # Converted to float32 a chunk at a time, so the full matrix is never expanded
+        return np.concatenate([
+            codes[start:start + chunk_size].astype(np.float32) @ query
+            for start in range(0, len(codes), chunk_size)
+        ]) * scales if len(codes) else np.empty(0, dtype=np.float32)
+
+
+class LocalHandbookCollection:
+    """A local, file-backed vector store for EmployeeHandbookModel records.
+
+    It answers the calls AiSearchPlugin makes on an AzureAISearchCollection
+    (collection_exists, search) so it can be used in its place, offline and
+    without any cloud service. The index is a directory holding:
+    - vectors.npy: unit-length float32 embeddings, one row per record, memory-mapped
+      so opening the index does not read it into memory
+    - records.jsonl: the records without their vectors, in row order
+    - ivf.npz: the optional IVF index
+    - int8.npz / binary.npz: the optional quantized vectors
+
+    index_kind selects exact search (one matrix product over every row), IVF
+    search (only the rows of the n_probe clusters nearest the query; approximate)
+    or "auto", which builds an IVF index from IVF_MIN_ROWS rows on. Scores are
+    cosine similarities. hybrid_search also ranks the records with BM25 over their
+    title and content, built in memory on first use.
+
+    With quantization "int8" or "binary", searches first score rows with the
+    QuantizedVectors held in memory, then rescore the best top * rescore_factor of
+    them with their float32 vectors, so the returned scores are exact cosines.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_INDEX_PATH,
+        index_kind: str = "auto",
+        n_probe: int = 8,
+        quantization: str = "none",
+        rescore_factor: int = 4,
+    ):
+        if index_kind not in INDEX_KINDS:
+            raise ValueError(f"index_kind must be one of {', '.join(INDEX_KINDS)}, not {index_kind!r}")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {', '.join(QUANTIZATIONS)}, not {quantization!r}")
+        self.path = Path(path)
+        self.index_kind = index_kind
+        self.n_probe = n_probe
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self._vectors: np.ndarray | None = None
+        self._quantized: QuantizedVectors | None = None
+        self._records: list[dict[str, Any]] = []
+        self._ivf: IvfIndex | None = None
+        self._bm25: BM25Index | None = None
+        self._staged: dict[str, tuple[dict[str, Any], np.ndarray]] | None = None
+        self._load()
+
+    def __len__(self):
+        return len(self._records)
+
+    async def collection_exists(self) -> bool:
+        return (self.path / "vectors.npy").exists()
+
+    async def ensure_collection_exists(self):
+        if not await self.collection_exists():
+            self._write([], np.empty((0, 0), dtype=np.float32))
+
+    @contextmanager
+    def deferred_writes(self):
+        """Within the block, upsert and delete only stage their changes; the index is written,
+        and its IVF index and quantized vectors rebuilt, once when the block exits.
+
+        Searches in the block still see the index as it was. If the block raises, nothing is written.
+        """
+        self._staged = self._rows()
+        try:
+            yield self
+            staged = self._staged
+        finally:
+            self._staged = None
+        self._write_rows(staged)
+
+    async def upsert(self, records: EmployeeHandbookModel | Iterable[EmployeeHandbookModel]):
+        """Add or replace records by chunk_id; every record needs its contentVector"""
+        if isinstance(records, EmployeeHandbookModel):
+            records = [records]
+        rows = self._staged if self._staged is not None else self._rows()
+        for record in records:
+            if record.contentVector is None:
+                raise ValueError(f"Record {record.chunk_id} has no contentVector")
+            rows[record.chunk_id] = (record.model_dump(exclude={"contentVector"}), record.contentVector)
+        if self._staged is None:
+            self._write_rows(rows)
+
+    async def delete(self, keys: str | Iterable[str]):
+        keys = {keys} if isinstance(keys, str) else set(keys)
+        rows = self._staged if self._staged is not None else self._rows()
+        for key in keys:
+            rows.pop(key, None)
+        if self._staged is None:
+            self._write_rows(rows)
+
+    async def search(self, vector: Any = None, top: int = 3, include_vectors: bool = False, **kwargs) -> KernelSearchResults:
+        """Return the top records most similar to vector, in the shape AzureAISearchCollection.search returns"""
+        hits = self.search_vectors(np.asarray(vector, dtype=np.float32)[None, :], top)[0]
+        return KernelSearchResults(results=self._results(hits, include_vectors), total_count=len(hits))
+
+    async def hybrid_search(self, values: str, vector: Any = None, top: int = 3, include_vectors: bool = False, **kwargs) -> KernelSearchResults:
+        """Return the top records for a keyword query and its vector, fusing the BM25 and vector rankings with RRF.
+
+        Like AzureAISearchCollection.hybrid_search, the scores are reciprocal rank fusion scores.
+        """
+        # Rank more candidates than requested from each side, so a record ranked well by both can surface
+        candidates = max(top * 4, 50)
+        vector_hits = self.search_vectors(np.asarray(vector, dtype=np.float32)[None, :], candidates)[0]
+        keyword_hits = self.keyword_index().search(values, candidates)
+        fused = reciprocal_rank_fusion([[row for row, _ in vector_hits], [row for row, _ in keyword_hits]])[:top]
+        return KernelSearchResults(results=self._results(fused, include_vectors), total_count=len(fused))
+
+    def keyword_index(self) -> BM25Index:
+        if self._bm25 is None:
+            self._bm25 = BM25Index(f"{record.get('title') or ''}\n{record.get('content') or ''}" for record in self._records)
+        return self._bm25
+
+    def search_vectors(self, queries: np.ndarray, top: int) -> list[list[tuple[int, float]]]:
+        """Return (row, score) pairs for the top rows of each query row, best first"""
+        if not self._records:
+            return [[] for _ in queries]
+        queries = normalize_rows(queries)
+        if self._ivf is None and self._quantized is None:
+            # Exact: one matrix product scores every row for every query
+            scores = queries @ self._vectors.T
+            return [[(int(row), float(row_scores[row])) for row in top_k(row_scores, top)] for row_scores in scores]
+        results = []
+        for query in queries:
+            candidates = None if self._ivf is None else self._ivf.candidates(query, self.n_probe)
+            if self._quantized is not None:
+                # Shortlist by the compact vectors, then read only the shortlisted float32 rows
+                shortlist = top_k(self._quantized.scores(query, candidates), top * self.rescore_factor)
+                candidates = shortlist if candidates is None else candidates[shortlist]
+            scores = self._vectors[candidates] @ query
+            results.append([(int(candidates[index]), float(scores[index])) for index in top_k(scores, top)])
+        return results
+
+    def record(self, row: int, include_vector: bool = False) -> EmployeeHandbookModel:
+        record = dict(self._records[row])
+        if include_vector:
+            record["contentVector"] = np.array(self._vectors[row])
+        return EmployeeHandbookModel.model_validate(record)
+
+    async def _results(self, hits: list[tuple[int, float]], include_vectors: bool) -> AsyncIterator[VectorSearchResult]:
+        for row, score in hits:
+            yield VectorSearchResult(record=self.record(row, include_vectors), score=score)
+
+    def _load(self):
+        if not (self.path / "vectors.npy").exists():
+            return
+        self._vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self._bm25 = None
+        with open(self.path / "records.jsonl") as file:
+            self._records = [json.loads(line) for line in file]
+        self._ivf = None
+        if self._use_ivf() and self._records:
+            ivf_path = self.path / "ivf.npz"
+            if ivf_path.exists():
+                self._ivf = IvfIndex.load(ivf_path)
+            else:
+                # An index written with another index kind gets its IVF index built once, on first load
+                self._ivf = IvfIndex.build(np.asarray(self._vectors))
+                self._ivf.save(ivf_path)
+        self._quantized = None
+        if self.quantization != "none" and self._records:
+            quantized_path = self.path / f"{self.quantization}.npz"
+            if quantized_path.exists():
+                self._quantized = QuantizedVectors.load(quantized_path)
+            else:
+                # An index written with another quantization setting is encoded once, on first load
+                self._quantized = QuantizedVectors.encode(self.quantization, self._vectors)
+                self._quantized.save(quantized_path)
+        logger.info(
+            f"Loaded local handbook index with {len(self._records)} records "
+            f"({'ivf' if self._ivf else 'exact'}, quantization {self.quantization})"
+        )
+
+    def _use_ivf(self) -> bool:
+        return self.index_kind == "ivf" or (self.index_kind == "auto" and len(self._records) >= IVF_MIN_ROWS)
+
+    def _rows(self) -> dict[str, tuple[dict[str, Any], np.ndarray]]:
+        """The records and their vectors by chunk_id, in row order; vectors are views of the memory-mapped matrix"""
+        return {record["chunk_id"]: (record, self._vectors[row]) for row, record in enumerate(self._records)}
+
+    def _write_rows(self, rows: dict[str, tuple[dict[str, Any], np.ndarray]]):
+        records = [record for record, _ in rows.values()]
+        vectors = np.array([vector for _, vector in rows.values()]) if rows else np.empty((0, 0), dtype=np.float32)
+        # The rows hold views of the memory-mapped vectors, which _write has to release
+        rows.clear()
+        self._write(records, vectors)
+
+    def _write(self, records: list[dict[str, Any]], vectors: np.ndarray):
+        """Write a complete new index next to the current one and swap it in"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_dir = Path(tempfile.mkdtemp(prefix=f".{self.path.name}-", dir=self.path.parent))
+        vectors = normalize_rows(vectors) if len(records) else vectors.astype(np.float32)
+        np.save(temp_dir / "vectors.npy", vectors)
+        with open(temp_dir / "records.jsonl", "w") as file:
+            file.writelines(json.dumps(record) + "\n" for record in records)
+        self._records = records
+        if self._use_ivf() and len(records):
+            IvfIndex.build(vectors).save(temp_dir / "ivf.npz")
+        if self.quantization != "none" and len(records):
+            QuantizedVectors.encode(self.quantization, vectors).save(temp_dir / f"{self.quantization}.npz")
+        # Windows cannot move a directory while a file in it is memory-mapped, so the
+        # current vectors are released; _load maps the new ones after the swap
+        self._vectors = None
+        old_dir = self.path.with_name(f".{self.path.name}-old")
+        # Left behind if an earlier swap was interrupted
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if self.path.exists():
+            os.replace(self.path, old_dir)
+        os.replace(temp_dir, self.path)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        self._load()
+
+
+def local_handbook_collection() -> LocalHandbookCollection:
+    """Create the local handbook collection configured from the environment.
+
+    HANDBOOK_LOCAL_INDEX_PATH selects the index directory, HANDBOOK_LOCAL_INDEX_KIND
+    the search (auto, exact or ivf), HANDBOOK_LOCAL_INDEX_N_PROBE how many IVF
+    clusters each query scores and HANDBOOK_LOCAL_INDEX_QUANTIZATION (none, int8 or
+    binary) and HANDBOOK_LOCAL_INDEX_RESCORE_FACTOR the compact vectors.
+    """
+    return LocalHandbookCollection(
+        path=os.environ.get("HANDBOOK_LOCAL_INDEX_PATH", str(DEFAULT_INDEX_PATH)),
+        index_kind=os.environ.get("HANDBOOK_LOCAL_INDEX_KIND", "auto"),
+        n_probe=int(os.environ.get("HANDBOOK_LOCAL_INDEX_N_PROBE", 8)),
+        quantization=os.environ.get("HANDBOOK_LOCAL_INDEX_QUANTIZATION", "none"),
+        rescore_factor=int(os.environ.get("HANDBOOK_LOCAL_INDEX_RESCORE_FACTOR", 4)),
+    )
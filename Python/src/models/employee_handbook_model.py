@@ -4,7 +4,8 @@
 from dataclasses import dataclass
 from typing import Annotated, Any
 
-from pydantic import BaseModel
+import numpy as np
+from pydantic import BaseModel, ConfigDict, field_serializer, field_validator
 
 from semantic_kernel.data.vector import (
     VectorStoreField,
@@ -19,12 +20,18 @@ from semantic_kernel.data.vector import (
 # This model adds vectors for the 2 descriptions in English and French.
 # Both are based on the 1536 dimensions of the OpenAI models.
 # You can adjust this at creation time and then make the change below as well.
+#
+# contentVector is held as a float32 NumPy array, about 6 KB for 1536 dimensions
+# instead of roughly 50 KB as a list of Python floats. Lists are converted on the
+# way in, and model_dump() turns the array back into a list for the vector stores.
 ###
 
 
 @vectorstoremodel
 @dataclass
 class EmployeeHandbookModel(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     chunk_id: Annotated[str, VectorStoreField("key")]
     parent_id: Annotated[str | None, VectorStoreField("data")] = None
     content: Annotated[str, VectorStoreField("data")]
@@ -32,11 +39,18 @@ class EmployeeHandbookModel(BaseModel):
     url: Annotated[str, VectorStoreField("data")]
     filepath: Annotated[str, VectorStoreField("data")]
     contentVector: Annotated[
-        list[float] | None,
+        list[float] | np.ndarray | None,
         VectorStoreField(
             "vector",
             dimensions=1536,
         ),
     ] = None
 
-   
\ No newline at end of file
+    @field_validator("contentVector", mode="before")
+    @classmethod
+    def _vector_to_array(cls, value: Any) -> np.ndarray | None:
+        return None if value is None else np.asarray(value, dtype=np.float32)
+
+    @field_serializer("contentVector")
+    def _vector_to_list(self, value: np.ndarray | None) -> list[float] | None:
+        return None if value is None else value.tolist()
@@ -0,0 +1,142 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable
+
+from semantic_kernel.functions import KernelFunctionFromMethod, KernelPlugin
+
+logger = logging.getLogger(__name__)
+
+OPENAPI_CACHE_DIR = Path(__file__).parent / ".cache" / "openapi"
+
+
+class StartupTimer:
+    """Collects how long each step of startup took, for a one-line breakdown.
+
+    Steps timed while a phase is running are reported as its children, in brackets
+    after it, since their time is already part of the phase's.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # (name, seconds, child steps) of the top-level steps
+        self.phases: list[tuple[str, float, list]] = []
+        # Child step lists of the phases that are running, innermost last
+        self._running: list[list] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        children = []
+        self._running.append(children)
+        try:
+            yield
+        finally:
+            self._running.pop()
+            self._add(name, time.perf_counter() - start, children)
+
+    def record(self, name: str, seconds: float):
+        """Add a step that was timed elsewhere; the total runs from the start of the earliest step"""
+        self._add(name, seconds, [])
+
+    def report(self) -> str:
+        total = time.perf_counter() - self.started
+        return f"{total * 1000:.0f} ms ({_format_steps(self.phases)})"
+
+    def _add(self, name: str, seconds: float, children: list):
+        (self._running[-1] if self._running else self.phases).append((name, seconds, children))
+        self.started = min(self.started, time.perf_counter() - seconds)
+
+
+def _format_steps(steps: list[tuple[str, float, list]]) -> str:
+    return ", ".join(
+        f"{name} {seconds * 1000:.0f} ms" + (f" [{_format_steps(children)}]" if children else "")
+        for name, seconds, children in steps
+    )
+
+
+# Shared by the loading helpers below, so ChatService can report every step
+startup_timer = StartupTimer()
+
+
+def lazy_plugin(plugin_class: type, factory: Callable[[], Any] | None = None, plugin_name: str | None = None) -> KernelPlugin:
+    """Create a KernelPlugin whose functions are described by plugin_class but which only creates the instance on first call.
+
+    The function metadata the model sees comes from the @kernel_function decorators on
+    the class, so registering the plugin costs no more than reading them. The plugin
+    instance, and any clients it opens in its constructor, is made with factory
+    (default: plugin_class()) the first time one of its functions is invoked.
+    """
+    plugin_name = plugin_name or plugin_class.__name__
+    factory = factory or plugin_class
+    instance = None
+
+    def get_instance():
+        nonlocal instance
+        if instance is None:
+            start = time.perf_counter()
+            instance = factory()
+            logger.info(f"Created plugin {plugin_name} on first use in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return instance
+
+    def lazy_function(method):
+        @functools.wraps(method)
+        async def call(**kwargs):
+            result = getattr(get_instance(), method.__name__)(**kwargs)
+            return await result if inspect.isawaitable(result) else result
+
+        # functools.wraps copied the @kernel_function metadata; the wrapper itself takes no self
+        del call.__wrapped__
+        return KernelFunctionFromMethod(method=call, plugin_name=plugin_name)
+
+    with startup_timer.phase(f"plugin {plugin_name}"):
+        functions = [
+            lazy_function(member)
+            for _, member in inspect.getmembers(plugin_class, inspect.isfunction)
+            if getattr(member, "__kernel_function__", False)
+        ]
+        return KernelPlugin(name=plugin_name, functions=functions)
+
+
+def load_openapi_spec(url: str, max_age_seconds: float | None = None) -> dict:
+    """Return the parsed, $ref-resolved OpenAPI document at url, cached on disk.
+
+    Fetching and resolving the document is the slow part of adding an OpenAPI
+    plugin, so the resolved document is stored as JSON under .cache/openapi and
+    reused while it is younger than max_age_seconds (OPENAPI_CACHE_MAX_AGE_SECONDS,
+    default one day). If the document cannot be fetched, a stale copy is used.
+    """
+    from semantic_kernel.connectors.openapi_plugin.openapi_parser import OpenApiParser
+
+    if max_age_seconds is None:
+        max_age_seconds = float(os.environ.get("OPENAPI_CACHE_MAX_AGE_SECONDS", 86400))
+    cache_path = OPENAPI_CACHE_DIR / f"{hashlib.sha256(url.encode()).hexdigest()[:16]}.json"
+
+    with startup_timer.phase(f"openapi {url}"):
+        if cache_path.exists() and time.time() - cache_path.stat().st_mtime < max_age_seconds:
+            with open(cache_path) as file:
+                return json.load(file)
+        try:
+            spec = OpenApiParser().parse(url)
+        except Exception as e:
+            if not cache_path.exists():
+                raise
+            logger.warning(f"Could not fetch OpenAPI document {url}, using the cached copy: {e}")
+            with open(cache_path) as file:
+                return json.load(file)
+        try:
+            OPENAPI_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_suffix(".tmp")
+            with open(temp_path, "w") as file:
+                json.dump(spec, file)
+            os.replace(temp_path, cache_path)
+        except (OSError, TypeError, ValueError) as e:
+            # A document with recursive schemas cannot be written as JSON once resolved
+            logger.warning(f"Could not cache OpenAPI document {url}: {e}")
+        return spec
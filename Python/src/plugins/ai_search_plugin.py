@@ -1,12 +1,38 @@
+import logging
 import os
 import sys
+import numpy as np
 from typing import TypedDict, Annotated
 from semantic_kernel.functions import kernel_function
-from semantic_kernel.connectors.azure_ai_search import AzureAISearchCollection
 from semantic_kernel.connectors.ai.open_ai import AzureTextEmbedding
 from semantic_kernel import Kernel
+from semantic_kernel.exceptions import VectorSearchOptionsException, VectorStoreOperationNotSupportedException
 
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import embedding_cache_for
 from models.employee_handbook_model import EmployeeHandbookModel
+from context_packing import pack_context
+from history_reducer import TokenCounter
+from retrieval import rerank, select_results
+
+logger = logging.getLogger(__name__)
+
+
+def is_configuration_error(error: BaseException) -> bool:
+    """Whether a search error comes from the collection or index setup rather than a transient failure.
+
+    The Azure AI Search error may be wrapped by Semantic Kernel, so the whole cause
+    chain is checked for an HTTP 400 (the request does not fit the index schema).
+    """
+    while error is not None:
+        if isinstance(error, (AttributeError, VectorStoreOperationNotSupportedException, VectorSearchOptionsException)):
+            return True
+        status_code = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+        if status_code == 400:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
 
 class AiSearchPlugin:
 
@@ -22,10 +48,45 @@ class AiSearchPlugin:
         if not kernel.get_service(type=AzureTextEmbedding):
             raise Exception("Missing AI Foundry embedding service")
         self.client = kernel.get_service(type=AzureTextEmbedding)
+        # Repeated queries, including the fixed connection test query, skip the embedding service
+        self.embedding_cache = embedding_cache_for(self.client.ai_model_id)
+        # Concurrent queries that miss the cache share one batched embedding call
+        self.embedding_batcher = EmbeddingBatcher(
+            self.client.generate_embeddings,
+            max_batch_size=int(os.environ.get("EMBEDDING_BATCH_SIZE", 16)),
+            max_wait_seconds=float(os.environ.get("EMBEDDING_BATCH_WAIT_MS", 5)) / 1000,
+        )
         
-        # Initialize the AI Search collection using the new API
+        # Retrieval settings: "hybrid" fuses keyword (BM25) and vector rankings, "vector" is vector only.
+        # search_candidates results are retrieved, reranked locally, then cut to search_top results
+        # scoring at least search_min_score and search_relative_score times the best score
+        self.search_mode = os.environ.get("HANDBOOK_SEARCH_MODE", "hybrid").lower()
+        self.search_top = int(os.environ.get("HANDBOOK_SEARCH_TOP", 3))
+        self.search_candidates = int(os.environ.get("HANDBOOK_SEARCH_CANDIDATES", 10))
+        self.search_rerank = os.environ.get("HANDBOOK_SEARCH_RERANK", "true").lower() == "true"
+        self.search_min_score = float(os.environ.get("HANDBOOK_SEARCH_MIN_SCORE", 0))
+        self.search_relative_score = float(os.environ.get("HANDBOOK_SEARCH_RELATIVE_SCORE", 0.5))
+        # The results are returned as cited passages packed into a token budget
+        self.context_tokens = int(os.environ.get("HANDBOOK_CONTEXT_TOKENS", 1200))
+        self.passage_tokens = int(os.environ.get("HANDBOOK_PASSAGE_TOKENS", 300))
+        self.token_counter = TokenCounter()
+
+        # Query vectors stay float32 arrays; only the Azure AI Search connector needs them as lists
+        self.vectors_as_lists = True
+
+        # HANDBOOK_VECTOR_STORE=local searches a local index instead of Azure AI Search
+        if os.environ.get("HANDBOOK_VECTOR_STORE", "azure").lower() == "local":
+            from local_vector_store import local_handbook_collection
+            self.collection = local_handbook_collection()
+            self.vectors_as_lists = False
+            print(f"✅ Local handbook index loaded from {self.collection.path} ({len(self.collection)} records)")
+            return
+
+        # Initialize the AI Search collection using the new API. The connector is imported
+        # here, since importing it is slow and only needed once the plugin is created
         print("Initializing AzureAISearchCollection...")
         try:
+            from semantic_kernel.connectors.azure_ai_search import AzureAISearchCollection
             self.collection = AzureAISearchCollection(record_type=EmployeeHandbookModel)
             print("✅ AzureAISearchCollection initialized successfully")
         except Exception as e:
@@ -36,14 +97,51 @@ class AiSearchPlugin:
     async def generate_vector(self,query: str) :
         try:
             print(f"Generating embedding for query: '{query}'")
-            response = await self.client.generate_embeddings([query])
+            misses = self.embedding_cache.stats.misses
+            response = await self.embedding_cache.get_or_create([query], self.embedding_batcher.embed_many)
             embedding = response[0]
-            print(f"✅ Embedding generated successfully. Dimensions: {len(embedding)}")
+            source = "generated" if self.embedding_cache.stats.misses > misses else "served from cache"
+            print(f"✅ Embedding {source}. Dimensions: {len(embedding)}, cache hit rate: {self.embedding_cache.stats.hit_rate:.0%}")
             return embedding
         except Exception as e:
             print(f"❌ Failed to generate embedding: {str(e)}")
             raise
 
+    def store_vector(self, vector: np.ndarray):
+        """The query vector in the form the collection takes"""
+        return vector.tolist() if self.vectors_as_lists else vector
+
+    async def search(self, query: str, vector: np.ndarray, top: int) -> list:
+        """Search the collection in the configured mode, falling back to vector search if hybrid search fails.
+
+        Only an index that cannot do hybrid search switches the mode to vector for good.
+        """
+        if self.search_mode == "hybrid":
+            try:
+                search_results = await self.collection.hybrid_search(
+                    values=query,
+                    vector=self.store_vector(vector),
+                    additional_property_name="content",
+                    top=top,
+                    include_vectors=False
+                )
+                # Azure AI Search only sends the request once the results are read
+                return [result async for result in search_results.results]
+            except Exception as e:
+                if is_configuration_error(e):
+                    # e.g. an Azure AI Search index whose content field is not searchable; retrying cannot help
+                    print(f"⚠️ Hybrid search is not supported by this index, using vector search from now on: {str(e)}")
+                    self.search_mode = "vector"
+                else:
+                    # e.g. a timeout or a 5xx; hybrid search is tried again on the next query
+                    logger.warning(f"Hybrid search failed, using vector search for this query: {e}")
+        search_results = await self.collection.search(
+            vector=self.store_vector(vector),
+            top=top,
+            include_vectors=False
+        )
+        return [result async for result in search_results.results]
+
     @kernel_function(description="Verify Azure AI Search connection and configuration", name="verify_search_connection")
     async def verify_search_connection(self) -> str:
         """Test connectivity to Azure AI Search service and verify configuration."""
@@ -89,7 +187,7 @@ class AiSearchPlugin:
                 # Check for results
                 print("Executing vector search with test query...")
                 search_results = await self.collection.search(
-                    vector=test_vector,
+                    vector=self.store_vector(test_vector),
                     top=1,
                     include_vectors=False
                 )
@@ -142,21 +240,19 @@ class AiSearchPlugin:
         collection_name = os.environ.get('AZURE_AI_SEARCH_INDEX_NAME', 'employeehandbook')
         print(f"Using collection name: {collection_name}")
         
-        print(f"Executing vector search with query: '{query_str}'")
-        search_results = await self.collection.search(
-            vector=query_vector,
-            top=3,
-            include_vectors=False
-        )
+        print(f"Executing {self.search_mode} search with query: '{query_str}'")
+        candidates = await self.search(query_str, query_vector, self.search_candidates)
+        if self.search_rerank:
+            candidates = rerank(query_str, candidates)
+        result_list = select_results(candidates, self.search_top, self.search_min_score, self.search_relative_score)
 
-        result_list = []
         count = 0
-        async for result in search_results.results:
+        for result in result_list:
             count += 1
-            result_list.append(result)
             print(
                 f"Result {count}: {result.record.parent_id} (with {result.record.title}, score: {result.score})"
             )
+        print(f"Kept {count} of {len(candidates)} candidates")
             
         if count == 0:
             print("\n⚠️ No results found. Verify your search index configuration.")
@@ -165,6 +261,9 @@ class AiSearchPlugin:
             print("2. The vector field name 'contentVector' matches your index schema")
             print("3. The vector dimensions match those expected by your index")
             print("4. You have proper permissions to access the index")
-            
-        return result_list
+            return "No matching content was found in the employee handbook."
+
+        context = pack_context(query_str, result_list, self.token_counter, self.context_tokens, self.passage_tokens)
+        print(f"Packed {count} results into {self.token_counter.count(context)} tokens")
+        return context
 
@@ -1,20 +1,82 @@
 from typing import TypedDict, Annotated, Optional  
-import requests  
 import asyncio  
+import httpx
 from semantic_kernel.functions import kernel_function
 import os
 from dotenv import load_dotenv
 
+from geocoding_cache import geocoding_cache_from_env, normalize_location
+
 load_dotenv(override=True)
 
+GEOCODING_URL = "https://geocode.maps.co/search"
+
 class GeoPlugin:  
 
+    def __init__(self):
+        # Places that were looked up before cost no HTTP call, across sessions and restarts
+        self.cache = geocoding_cache_from_env()
+        self.timeout_seconds = float(os.environ.get("GEOCODING_TIMEOUT_SECONDS", 10))
+        self.max_concurrency = int(os.environ.get("GEOCODING_CONCURRENCY", 2))
+        # Created on first use, on the event loop that makes the requests
+        self._client = None
+        self._semaphore = None
+        # Lookups in flight, so concurrent requests for the same place share one HTTP call
+        self._pending: dict[str, asyncio.Future] = {}
+
+    def client(self) -> httpx.AsyncClient:
+        """The shared client; its connection pool keeps connections to the geocoding service open between calls"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout_seconds),
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def lookup(self, location: str) -> tuple[str, str] | None:
+        """Return (latitude, longitude) for a location from the cache or the geocoding service, or None if it is not found"""
+        cached = self.cache.get(location)
+        if cached is not None:
+            print(f"lat/long for {location} served from cache")
+            return cached
+        key = normalize_location(location)
+        if key not in self._pending:
+            self._pending[key] = asyncio.ensure_future(self._fetch(location))
+            self._pending[key].add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(self._pending[key])
+
+    async def _fetch(self, location: str) -> tuple[str, str] | None:
+        client = self.client()
+        async with self._semaphore:
+            response = await client.get(GEOCODING_URL, params={"q": location, "api_key": os.getenv('GEOCODING_API_KEY')})
+        response.raise_for_status()
+        data = response.json()
+        if not data:
+            return None
+        position = (data[0]['lat'], data[0]['lon'])
+        self.cache.put(location, *position)
+        return position
+
+    async def describe(self, location: str) -> str:
+        try:
+            position = await self.lookup(location)
+        except httpx.HTTPStatusError as e:
+            # Not str(e): it contains the request URL, API key included
+            return f"Could not look up {location}: the geocoding service returned HTTP {e.response.status_code}"
+        except httpx.HTTPError as e:
+            return f"Could not look up {location}: {type(e).__name__}"
+        if position is None:
+            return f"No coordinates found for {location}"
+        return f"Latitude: {position[0]}, Longitude: {position[1]}"
+
     @kernel_function(description="Gets the latitude and longitude for a location.")
     async def get_latitude_longitude(self, location:Annotated[str, "The name of the location"]):  
         print(f"lat/long request location: {location}")
-        url = f"https://geocode.maps.co/search?q={location}&api_key={os.getenv('GEOCODING_API_KEY')}"  
-        response = requests.get(url) 
-        data = response.json() 
-        position = data[0]
-        return f"Latitude: {position['lat']}, Longitude: {position['lon']}"
-    
\ No newline at end of file
+        return await self.describe(location)
+
+    @kernel_function(description="Gets the latitude and longitude for several locations at once.")
+    async def get_latitudes_longitudes(self, locations:Annotated[list[str], "The names of the locations"]):
+        print(f"lat/long request locations: {locations}")
+        results = await asyncio.gather(*(self.describe(location) for location in locations))
+        return "\n".join(f"{location}: {result}" for location, result in zip(locations, results))
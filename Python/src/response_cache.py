@@ -0,0 +1,185 @@
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Hashable
+
+import numpy as np
+from semantic_kernel.connectors.ai.embedding_generator_base import EmbeddingGeneratorBase
+
+from caching import WHITESPACE
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lower-case the prompt, collapse whitespace and drop trailing punctuation"""
+    return WHITESPACE.sub(" ", prompt.lower()).strip().rstrip("?!. ")
+
+
+@dataclass
+class CacheEntry:
+    response: str
+    created: float
+    tags: frozenset[str]
+    embedding: np.ndarray | None = None
+
+
+@dataclass
+class CacheStats:
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    # Durations of the most recent lookups
+    lookup_seconds: deque[float] = field(default_factory=lambda: deque(maxlen=1000), repr=False)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+
+
+class ResponseCache:
+    """LRU cache of chat responses, matched by normalized prompt or by embedding similarity.
+
+    A lookup first tries the normalized prompt, then, if an embedding service is
+    given, the most similar cached prompt whose cosine similarity reaches
+    similarity_threshold. Entries expire after ttl_seconds and the least recently
+    used ones are evicted beyond max_entries.
+
+    Entries are tagged, e.g. with the plugins whose functions produced the answer,
+    so they can be invalidated selectively: either explicitly with invalidate(tag)
+    or through a version source registered with add_invalidation_source, which is
+    polled at most every poll_seconds and drops the tag's entries when the version
+    it reports changes.
+
+    The cache is not thread-safe; it is meant to be used from one event loop.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingGeneratorBase | None = None,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000,
+        poll_seconds: float = 1.0,
+    ):
+        self.embedding_service = embedding_service
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.poll_seconds = poll_seconds
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        # Embeddings of recent lookups, so storing a missed prompt does not embed it again
+        self._pending_embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+        # tag -> [fetch version, last version, last polled]
+        self._sources: dict[str, list] = {}
+        # Normalized embeddings of all entries as one matrix, rebuilt when entries change
+        self._matrix: np.ndarray | None = None
+        self._matrix_keys: list[str] = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add_invalidation_source(self, tag: str, fetch_version: Callable[[], Awaitable[Hashable]]):
+        """Drop entries tagged with tag whenever the version returned by fetch_version changes"""
+        self._sources[tag] = [fetch_version, None, 0.0]
+
+    async def get(self, prompt: str) -> str | None:
+        start = time.perf_counter()
+        try:
+            await self._poll_sources()
+            key = normalize_prompt(prompt)
+            entry = self._live_entry(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats.exact_hits += 1
+                return entry.response
+
+            if self.embedding_service is not None and self._entries:
+                embedding = await self._embed(key)
+                match = self._most_similar(embedding)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.stats.semantic_hits += 1
+                    return self._entries[match].response
+
+            self.stats.misses += 1
+            return None
+        finally:
+            self.stats.lookup_seconds.append(time.perf_counter() - start)
+
+    async def put(self, prompt: str, response: str, tags: set[str] | frozenset[str] = frozenset()):
+        key = normalize_prompt(prompt)
+        embedding = await self._embed(key) if self.embedding_service is not None else None
+        self._entries[key] = CacheEntry(response=response, created=time.monotonic(), tags=frozenset(tags), embedding=embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+        self._matrix = None
+
+    def invalidate(self, tag: str | None = None):
+        """Drop every entry, or only the entries tagged with tag"""
+        keys = [key for key, entry in self._entries.items() if tag is None or tag in entry.tags]
+        for key in keys:
+            del self._entries[key]
+        if keys:
+            self.stats.invalidations += len(keys)
+            self._matrix = None
+            logger.info(f"Invalidated {len(keys)} cached responses" + (f" tagged {tag}" if tag else ""))
+
+    def _live_entry(self, key: str) -> CacheEntry | None:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.created > self.ttl_seconds:
+            del self._entries[key]
+            self._matrix = None
+            return None
+        return entry
+
+    async def _poll_sources(self):
+        now = time.monotonic()
+        for tag, source in self._sources.items():
+            fetch_version, last_version, last_polled = source
+            if now - last_polled < self.poll_seconds:
+                continue
+            try:
+                version = await fetch_version()
+            except Exception as e:
+                logger.warning(f"Could not check the version of {tag}, dropping its cached responses: {e}")
+                version = None
+            if version != last_version or version is None:
+                self.invalidate(tag)
+            source[1:] = [version, now]
+
+    async def _embed(self, key: str) -> np.ndarray:
+        embedding = self._pending_embeddings.pop(key, None)
+        if embedding is None:
+            embedding = np.asarray((await self.embedding_service.generate_embeddings([key]))[0], dtype=np.float32)
+            embedding /= np.linalg.norm(embedding) or 1.0
+        self._pending_embeddings[key] = embedding
+        while len(self._pending_embeddings) > 100:
+            self._pending_embeddings.popitem(last=False)
+        return embedding
+
+    def _most_similar(self, embedding: np.ndarray) -> str | None:
+        if self._matrix is None:
+            self._matrix_keys = [key for key, entry in self._entries.items() if entry.embedding is not None]
+            self._matrix = (
+                np.stack([self._entries[key].embedding for key in self._matrix_keys])
+                if self._matrix_keys else np.empty((0, embedding.shape[0]), dtype=np.float32)
+            )
+        if not self._matrix_keys:
+            return None
+        similarities = self._matrix @ embedding
+        # Best matches first, skipping any that expired since the matrix was built
+        for index in np.argsort(-similarities):
+            if similarities[index] < self.similarity_threshold:
+                return None
+            key = self._matrix_keys[index]
+            if self._live_entry(key) is not None:
+                return key
+        return None
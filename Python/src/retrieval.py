@@ -0,0 +1,143 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Hashable, Iterable, Sequence
+
+import numpy as np
+from semantic_kernel.data.vector import VectorSearchResult
+
+from workitems.bm25 import B, K1, idf, term_score
+
+WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it me my of on or our should the "
+    "their there this to was we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase words without stopwords, with a plural "s" stripped so "reviews" matches "review" """
+    tokens = []
+    for word in WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 keyword index over a fixed list of documents.
+
+    Postings are stored per term as arrays of document IDs and term counts, so
+    scoring a query touches only the documents that contain its terms. Scoring is
+    the same as the work item search index's; the tokenizer differs, dropping
+    stopwords and plurals because handbook queries are questions in prose.
+    """
+
+    def __init__(self, documents: Iterable[str], k1: float = K1, b: float = B):
+        self.k1 = k1
+        self.b = b
+        postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for doc_id, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                postings[term].append((doc_id, count))
+        self.lengths = np.array(lengths, dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if lengths else 0.0
+        self.postings = {
+            term: (np.array([doc_id for doc_id, _ in docs]), np.array([count for _, count in docs], dtype=np.float32))
+            for term, docs in postings.items()
+        }
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for query; 0 for documents without any of its terms"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            doc_ids, counts = self.postings[term]
+            scores[doc_ids] += term_score(
+                idf(len(self), len(doc_ids)), counts, self.lengths[doc_ids], self.average_length, self.k1, self.b
+            )
+        return scores
+
+    def search(self, query: str, top: int) -> list[tuple[int, float]]:
+        """Return (document ID, score) pairs for the top matching documents, best first"""
+        scores = self.scores(query)
+        matches = np.flatnonzero(scores)
+        best = matches[np.argsort(-scores[matches])[:top]]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in best]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> list[tuple[Hashable, float]]:
+    """Fuse several best-first rankings into one, scoring each item sum(1 / (k + rank)).
+
+    Only ranks are used, so rankings with incomparable scores (cosine, BM25) can be
+    combined without normalizing them.
+    """
+    scores: dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def lexical_overlap(query: str, results: Sequence[VectorSearchResult]) -> list[float]:
+    """Score in [0, 1] for how well each result's text covers the query terms.
+
+    Terms are weighted by how rare they are among the results, so a match on a
+    distinctive word counts for more than one every result shares; matches in the
+    title add a bonus.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return [0.0] * len(results)
+    contents = [set(tokenize(result.record.content or "")) for result in results]
+    titles = [set(tokenize(result.record.title or "")) for result in results]
+    weights = {
+        term: math.log(1 + len(results) / (1 + sum(term in content or term in title for content, title in zip(contents, titles))))
+        for term in terms
+    }
+    total = sum(weights.values()) or 1
+    return [
+        min(1.0, sum(weights[term] for term in terms & content) / total + 0.25 * sum(weights[term] for term in terms & title) / total)
+        for content, title in zip(contents, titles)
+    ]
+
+
+def rerank(query: str, results: Sequence[VectorSearchResult], lexical_weight: float = 0.4) -> list[VectorSearchResult]:
+    """Reorder search results with a lightweight local reranker.
+
+    Each result is scored by a mix of its retrieval score (scaled so the best is 1)
+    and its lexical overlap with the query. The returned results carry the new
+    score, in [0, 1], best first.
+    """
+    if not results:
+        return []
+    best_score = max(result.score or 0 for result in results) or 1
+    overlaps = lexical_overlap(query, results)
+    reranked = [
+        VectorSearchResult(
+            record=result.record,
+            score=(1 - lexical_weight) * (result.score or 0) / best_score + lexical_weight * overlap,
+        )
+        for result, overlap in zip(results, overlaps)
+    ]
+    return sorted(reranked, key=lambda result: result.score, reverse=True)
+
+
+def select_results(
+    results: Sequence[VectorSearchResult], top: int, min_score: float = 0.0, relative_score: float = 0.0
+) -> list[VectorSearchResult]:
+    """Keep at most top best-first results scoring at least min_score and at least relative_score times the best score"""
+    if not results:
+        return []
+    cutoff = max(min_score, relative_score * (results[0].score or 0))
+    return [result for result in results[:top] if (result.score or 0) >= cutoff]
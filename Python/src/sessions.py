@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SessionPool(Generic[T]):
+    """Per-session state keyed by session ID, with LRU, TTL and size limits.
+
+    Sessions are created on first use with the factory and evicted when they have
+    not been used for ttl_seconds, when there are more than max_sessions, or when
+    the combined size of all sessions exceeds max_total_size; the least recently
+    used ones go first. Sizes come from the size function and are refreshed each
+    time a session is handed out, so they lag one use behind.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], T],
+        max_sessions: int = 1000,
+        ttl_seconds: float = 3600,
+        size: Callable[[T], int] | None = None,
+        max_total_size: int | None = None,
+    ):
+        self._factory = factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._size = size
+        self.max_total_size = max_total_size
+        self._lock = threading.Lock()
+        # session ID -> (session, last used, size), least recently used first
+        self._sessions: OrderedDict[str, tuple[T, float, int]] = OrderedDict()
+        self._total_size = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def total_size(self) -> int:
+        return self._total_size
+
+    def get(self, session_id: str) -> T:
+        """Return the session for session_id, creating it if it does not exist or was evicted"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                session, size = self._factory(), 0
+            else:
+                session, size = entry[0], entry[2]
+                self._total_size -= size
+                if self._size is not None:
+                    size = self._size(session)
+            self._sessions[session_id] = (session, now, size)
+            self._total_size += size
+            self._evict(now, keep=session_id)
+            return session
+
+    def remove(self, session_id: str):
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self._total_size -= entry[2]
+
+    def _evict(self, now: float, keep: str):
+        while self._sessions:
+            session_id, (_, last_used, size) = next(iter(self._sessions.items()))
+            if session_id == keep:
+                return
+            expired = now - last_used > self.ttl_seconds
+            too_many = len(self._sessions) > self.max_sessions
+            too_large = self.max_total_size is not None and self._total_size > self.max_total_size
+            if not (expired or too_many or too_large):
+                return
+            del self._sessions[session_id]
+            self._total_size -= size
+            logger.info(f"Evicted session {session_id} ({'expired' if expired else 'pool full'})")
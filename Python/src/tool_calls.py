@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+from semantic_kernel.filters import AutoFunctionInvocationContext
+from semantic_kernel.functions import FunctionResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ToolCall:
+    name: str
+    round: int
+    started: float
+    seconds: float
+    # Time spent waiting for a free slot before the call started
+    waited: float
+    timed_out: bool = False
+
+
+@dataclass
+class ToolCallTurn:
+    """The tool calls made while answering one message"""
+
+    semaphore: asyncio.Semaphore
+    calls: list[ToolCall] = field(default_factory=list)
+
+    def wall_seconds(self) -> float:
+        """Time spent in tool calls, counting calls that ran concurrently in one round once"""
+        total = 0.0
+        for round in {call.round for call in self.calls}:
+            calls = [call for call in self.calls if call.round == round]
+            total += max(call.started + call.seconds for call in calls) - min(call.started for call in calls)
+        return total
+
+    def summary(self) -> str:
+        calls = ", ".join(
+            f"{call.name} {call.seconds * 1000:.0f} ms" + (" (timed out)" if call.timed_out else "") for call in self.calls
+        )
+        return (
+            f"{len(self.calls)} tool calls: {sum(call.seconds for call in self.calls):.2f} s sequential, "
+            f"{self.wall_seconds():.2f} s concurrent [{calls}]"
+        )
+
+
+class ToolCallScheduler:
+    """Auto function invocation filter that bounds and times the tool calls of each turn.
+
+    When the model requests several tool calls in one response, Semantic Kernel
+    invokes them concurrently. This filter caps how many of one turn's calls run
+    at once, gives every call a timeout after which the model gets an error result
+    instead of waiting on a slow tool, and records the latency of each call.
+
+    A turn is registered with start_turn(chat_history) and ended with
+    finish_turn(chat_history); calls are matched to their turn by chat history,
+    so sessions sharing the kernel do not share a limit.
+    """
+
+    def __init__(self, max_concurrency: int = 4, timeout_seconds: float | None = 30):
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self._turns: dict[int, ToolCallTurn] = {}
+
+    def start_turn(self, chat_history) -> ToolCallTurn:
+        turn = ToolCallTurn(semaphore=asyncio.Semaphore(self.max_concurrency))
+        self._turns[id(chat_history)] = turn
+        return turn
+
+    def finish_turn(self, chat_history) -> ToolCallTurn | None:
+        turn = self._turns.pop(id(chat_history), None)
+        if turn is not None and turn.calls:
+            logger.info(turn.summary())
+        return turn
+
+    async def invoke(self, context: AutoFunctionInvocationContext, next):
+        turn = self._turns.get(id(context.chat_history))
+        name = context.function.fully_qualified_name
+        queued = time.perf_counter()
+        async with turn.semaphore if turn is not None else nullcontext():
+            started = time.perf_counter()
+            timed_out = False
+            try:
+                await asyncio.wait_for(next(context), self.timeout_seconds)
+            except asyncio.TimeoutError:
+                timed_out = True
+                logger.warning(f"Tool call {name} timed out after {self.timeout_seconds} s")
+                context.function_result = FunctionResult(
+                    function=context.function.metadata,
+                    value=f"The function {name} did not respond within {self.timeout_seconds} seconds.",
+                )
+            seconds = time.perf_counter() - started
+        if turn is not None:
+            turn.calls.append(ToolCall(
+                name=name, round=context.request_sequence_index, started=started, seconds=seconds,
+                waited=started - queued, timed_out=timed_out,
+            ))
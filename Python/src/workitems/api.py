@@ -1,11 +1,28 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 import pandas as pd
-from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import csv
 import uvicorn
 
+try:
+    from .schemas import (
+        BatchItemResult, BatchResult, ImportResult, WorkItemChange, WorkItemChanges, WorkItemIdBatch,
+        WorkItemPatchBatch, WorkItemSearchHit, WorkItemStats, WorkItemsBatch, WorkItemsDTO, WorkItemsView,
+    )
+    from .store import VersionConflict, WorkItemStore
+    from .persistence import SqliteBackend
+    from .transfer import EXPORT_FORMATS, export_work_items, import_work_items
+except ImportError:
+    from schemas import (
+        BatchItemResult, BatchResult, ImportResult, WorkItemChange, WorkItemChanges, WorkItemIdBatch,
+        WorkItemPatchBatch, WorkItemSearchHit, WorkItemStats, WorkItemsBatch, WorkItemsDTO, WorkItemsView,
+    )
+    from store import VersionConflict, WorkItemStore
+    from persistence import SqliteBackend
+    from transfer import EXPORT_FORMATS, export_work_items, import_work_items
+
 
 app = FastAPI(
     title="Work Items API",
@@ -15,30 +32,24 @@ app = FastAPI(
         {"url": "http://localhost:8001", "description": "Local development server"},
     ],
 )
-class WorkItemsDTO(BaseModel):
-    ID: int
-    WorkItemType: str
-    Title: str
-    AssignedTo: str
-    State: str
-    Tags: str
 
 # Get the directory where this script is located
 script_dir = os.path.dirname(os.path.abspath(__file__))
 # Construct path to workitems.csv
 csv_path = os.path.join(script_dir, "data", "workitems.csv")
 
-workitems = []
-workItemTypes = set()
-workItemStates = set()
+# Optional SQLite database that makes changes durable, e.g. WORKITEMS_DB_PATH=data/workitems.db.
+# Without it the work items only live in memory and are reloaded from the CSV on every start.
+db_path = os.environ.get("WORKITEMS_DB_PATH")
+if db_path and not os.path.isabs(db_path):
+    db_path = os.path.join(script_dir, db_path)
 
-def load_work_items_from_csv(file_path):
+def read_work_items_from_csv(file_path):
     if os.path.exists(file_path):
         with open(file_path, mode='r', encoding='utf-8-sig') as file:
             reader = csv.DictReader(file)
             for row in reader:
-                print(row)
-                work_item = WorkItemsDTO(
+                yield WorkItemsDTO(
                     ID=int(row['ID']),
                     WorkItemType=row['WorkItemType'],
                     Title=row['Title'],
@@ -46,12 +57,25 @@ def load_work_items_from_csv(file_path):
                     State=row['State'],
                     Tags=row['Tags']
                 )
-                workitems.append(work_item)
-                workItemTypes.add(work_item.WorkItemType)
-                workItemStates.add(work_item.State)
+
+def load_work_items(file_path):
+    """Load the store from the database, importing the CSV only when there is nothing stored yet"""
+    if db_path is None:
+        store = WorkItemStore()
+        store.load(read_work_items_from_csv(file_path))
+    else:
+        backend = SqliteBackend(db_path)
+        store = WorkItemStore(backend)
+        if backend.is_empty():
+            print(f"Importing work items from {file_path} into {db_path}")
+            store.import_items(read_work_items_from_csv(file_path))
+        else:
+            store.load(*backend.load())
+    print(f"Loaded {len(store)} work items")
+    return store
 
 # Load the workitems using the absolute path
-load_work_items_from_csv(csv_path)
+workitems = load_work_items(csv_path)
 
 
 app.add_middleware(
@@ -60,61 +84,268 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
-@app.get("/workitems", response_model=list[WorkItemsDTO])
-async def get_all_work_items():
-    return workitems
+@app.middleware("http")
+async def refresh_store(request: Request, call_next):
+    """Pick up changes committed by other worker processes sharing the database before serving a request"""
+    workitems.refresh()
+    return await call_next(request)
+
+MAX_PAGE_SIZE = 1000
+
+def not_modified(request: Request, response: Response, etag: str):
+    """Set the ETag header and return True if the client's If-None-Match already names this version"""
+    response.headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+def store_etag():
+    return f'W/"{workitems.version()}"'
+
+def item_etag(id):
+    return f'"{workitems.item_version(id)}"'
+
+def expected_version(request: Request, id):
+    """Return the item version named by If-Match, None if there is no precondition, or raise 412 if it cannot match"""
+    if_match = request.headers.get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return None
+    # If-Match uses strong comparison, so weak ETags never match
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag == item_etag(id):
+            return workitems.item_version(id)
+    raise HTTPException(status_code=412, detail="Work item has changed", headers={"ETag": item_etag(id)})
+
+@app.get("/workitems", response_model=list[WorkItemsView], response_model_exclude_none=True)
+async def get_all_work_items(
+    request: Request,
+    response: Response,
+    work_item_type: str | None = Query(None, alias="type", description="Only return work items of this type, e.g. 'Bug'"),
+    state: str | None = Query(None, description="Only return work items in this state, e.g. 'New'"),
+    assigned_to: str | None = Query(None, description="Only return work items assigned to this person"),
+    tag: str | None = Query(None, description="Only return work items carrying this tag"),
+    cursor: int | None = Query(None, description="Only return work items with an ID greater than this; pass the last ID of the previous page"),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of work items to return"),
+    fields: str | None = Query(None, description="Comma-separated fields to return, e.g. 'Title,State'. ID is always included"),
+):
+    filters = {
+        field: value
+        for field, value in (("WorkItemType", work_item_type), ("State", state), ("AssignedTo", assigned_to))
+        if value is not None
+    }
+    etag = store_etag()
+    if not_modified(request, response, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    page = workitems.query(filters, tag=tag, after=cursor, limit=limit)
+    if limit is not None and len(page) == limit:
+        response.headers["X-Next-Cursor"] = str(page[-1].ID)
+
+    if fields is None:
+        return page
+    selected = {field.strip() for field in fields.split(",") if field.strip()} | {"ID"}
+    unknown = selected - WorkItemsDTO.model_fields.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [{field: getattr(item, field) for field in selected} for item in page]
+
+@app.get("/workitems/changes", response_model=WorkItemChanges)
+async def get_work_item_changes(
+    since: int = Query(0, ge=0, description="Store version the caller has already seen; 0 returns every change"),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of changes to return; a batch is never split, so a page may exceed it"),
+):
+    """List the work items created, updated or deleted after a store version"""
+    changes, has_more = workitems.changes_since(since, limit=limit)
+    return WorkItemChanges(
+        version=changes[-1][1] if has_more else max(since, workitems.version()),
+        has_more=has_more,
+        changes=[
+            WorkItemChange(ID=id, version=version, deleted=item is None, item=item)
+            for id, version, item in changes
+        ],
+    )
+
+GROUP_BY_FIELDS = {"type": "WorkItemType", "state": "State", "assigned_to": "AssignedTo", "tag": "Tags"}
+
+@app.get("/workitems/stats", response_model=WorkItemStats)
+async def get_work_item_stats(
+    group_by: str = Query("state", description="Comma-separated fields to group by: type, state, assigned_to, tag"),
+    work_item_type: str | None = Query(None, alias="type", description="Only count work items of this type, e.g. 'Bug'"),
+    state: str | None = Query(None, description="Only count work items in this state, e.g. 'New'"),
+    assigned_to: str | None = Query(None, description="Only count work items assigned to this person"),
+    tag: str | None = Query(None, description="Only count work items carrying this tag"),
+):
+    """Count work items grouped by type, state, assignee or tag, e.g. open bugs per assignee"""
+    groups = [group.strip() for group in group_by.split(",") if group.strip()]
+    unknown = [group for group in groups if group not in GROUP_BY_FIELDS]
+    if not groups or unknown:
+        raise HTTPException(status_code=400, detail=f"group_by must be a comma-separated list of: {', '.join(GROUP_BY_FIELDS)}")
+    filters = {
+        field: value
+        for field, value in (("WorkItemType", work_item_type), ("State", state), ("AssignedTo", assigned_to))
+        if value is not None
+    }
+    total, counts = workitems.count([GROUP_BY_FIELDS[group] for group in groups], filters, tag=tag)
+    return WorkItemStats(
+        total=total,
+        groups=[{**dict(zip(groups, key)), "count": count} for key, count in counts.most_common()],
+    )
+
+@app.get("/workitems/search", response_model=list[WorkItemSearchHit])
+async def search_work_items(
+    q: str = Query(..., min_length=1, description="Keywords to look for in work item titles and tags"),
+    top: int = Query(10, ge=1, le=100, description="Maximum number of results to return"),
+):
+    """Keyword search over work item titles and tags, best matches first"""
+    return [
+        WorkItemSearchHit(**work_item.model_dump(), score=round(score, 4))
+        for work_item, score in workitems.search(q, top)
+    ]
 
 @app.get("/workitems/{id}", response_model=WorkItemsDTO)
-async def get_work_item_by_id(id: int):
-    work_item = next((item for item in workitems if item.ID == id), None)
+async def get_work_item_by_id(id: int, request: Request, response: Response):
+    work_item = workitems.get(id)
     if not work_item:
         raise HTTPException(status_code=404, detail="Work item not found")
+    etag = item_etag(id)
+    if not_modified(request, response, etag):
+        return Response(status_code=304, headers={"ETag": etag})
     return work_item
 
 @app.post("/workitems", response_model=WorkItemsDTO, status_code=201)
-async def create_work_item(new_work_item: WorkItemsDTO):
-    workitems.append(new_work_item)
-    workItemTypes.add(new_work_item.WorkItemType)
-    workItemStates.add(new_work_item.State)
-    return new_work_item
+async def create_work_item(new_work_item: WorkItemsDTO, response: Response):
+    try:
+        work_item = workitems.add(new_work_item)
+    except KeyError:
+        raise HTTPException(status_code=409, detail="Work item already exists")
+    response.headers["ETag"] = item_etag(work_item.ID)
+    return work_item
 
 @app.put("/workitems/{id}", response_model=WorkItemsDTO)
-async def update_work_item(id: int, updated_work_item: WorkItemsDTO):
-    work_item = next((item for item in workitems if item.ID == id), None)
-    if not work_item:
+async def update_work_item(id: int, updated_work_item: WorkItemsDTO, request: Request, response: Response):
+    if id not in workitems:
+        raise HTTPException(status_code=404, detail="Work item not found")
+    changes = {
+        field: value
+        for field, value in updated_work_item.model_dump(exclude={"ID"}).items()
+        if value
+    }
+    try:
+        work_item = workitems.update(id, expected_version=expected_version(request, id), **changes)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Work item not found")
-    if updated_work_item.WorkItemType:
-        work_item.WorkItemType = updated_work_item.WorkItemType
-        workItemTypes.add(updated_work_item.WorkItemType)
-    if updated_work_item.Title:
-        work_item.Title = updated_work_item.Title
-    if updated_work_item.AssignedTo:
-        work_item.AssignedTo = updated_work_item.AssignedTo
-    if updated_work_item.State:
-        work_item.State = updated_work_item.State
-        workItemStates.add(updated_work_item.State)
-    if updated_work_item.Tags:
-        work_item.Tags = updated_work_item.Tags
+    except VersionConflict:
+        raise HTTPException(status_code=412, detail="Work item has changed", headers={"ETag": item_etag(id)})
+    response.headers["ETag"] = item_etag(id)
     return work_item
 
 @app.delete("/workitems/{id}", status_code=204)
-async def delete_work_item(id: int):
-    global workitems
-    work_item = next((item for item in workitems if item.ID == id), None)
-    if not work_item:
+async def delete_work_item(id: int, request: Request):
+    if id not in workitems:
+        raise HTTPException(status_code=404, detail="Work item not found")
+    try:
+        workitems.delete(id, expected_version=expected_version(request, id))
+    except KeyError:
         raise HTTPException(status_code=404, detail="Work item not found")
-    workitems = [item for item in workitems if item.ID != id]
+    except VersionConflict:
+        raise HTTPException(status_code=412, detail="Work item has changed", headers={"ETag": item_etag(id)})
     return
 
+def check_batch(ids, must_exist, success_status):
+    """Check every ID in a batch and return the per-item results and whether all of them can be applied"""
+    results = []
+    seen = set()
+    for id in ids:
+        if id in seen:
+            results.append(BatchItemResult(ID=id, status=409, detail="Duplicate ID in batch"))
+        elif must_exist and id not in workitems:
+            results.append(BatchItemResult(ID=id, status=404, detail="Work item not found"))
+        elif not must_exist and id in workitems:
+            results.append(BatchItemResult(ID=id, status=409, detail="Work item already exists"))
+        else:
+            results.append(BatchItemResult(ID=id, status=success_status))
+        seen.add(id)
+    return results, all(result.status == success_status for result in results)
+
+def apply_batch(ids, must_exist, success_status, apply):
+    """Check a batch, apply it only if every item passes and return the batch result"""
+    results, ok = check_batch(ids, must_exist, success_status)
+    if ok:
+        try:
+            apply()
+        except KeyError:
+            # Another worker changed one of the items between the check and the commit
+            workitems.refresh(force=True)
+            results, ok = check_batch(ids, must_exist, success_status)[0], False
+    if not ok:
+        # Items that passed were not applied either, so they must not report success
+        results = [
+            BatchItemResult(ID=result.ID, status=424, detail="Not applied: another item in the batch failed")
+            if result.status == success_status else result
+            for result in results
+        ]
+        return JSONResponse(status_code=409, content=BatchResult(applied=False, results=results).model_dump())
+    return BatchResult(applied=True, results=results)
+
+@app.post("/workitems:batch", response_model=BatchResult, responses={409: {"model": BatchResult}})
+async def create_work_items_batch(batch: WorkItemsBatch):
+    """Create many work items in one request. Nothing is created if any item fails."""
+    return apply_batch(
+        [item.ID for item in batch.items], must_exist=False, success_status=201,
+        apply=lambda: workitems.add_many(batch.items),
+    )
+
+@app.patch("/workitems:batch", response_model=BatchResult, responses={409: {"model": BatchResult}})
+async def update_work_items_batch(batch: WorkItemPatchBatch):
+    """Update many work items in one request; only the fields given for each item are changed. Nothing is updated if any item fails."""
+    changes = {
+        patch.ID: patch.model_dump(exclude={"ID"}, exclude_unset=True, exclude_none=True)
+        for patch in batch.items
+    }
+    return apply_batch(
+        [patch.ID for patch in batch.items], must_exist=True, success_status=200,
+        apply=lambda: workitems.update_many(changes),
+    )
+
+@app.delete("/workitems:batch", response_model=BatchResult, responses={409: {"model": BatchResult}})
+async def delete_work_items_batch(batch: WorkItemIdBatch):
+    """Delete many work items in one request. Nothing is deleted if any item fails."""
+    return apply_batch(
+        batch.ids, must_exist=True, success_status=204,
+        apply=lambda: workitems.delete_many(batch.ids),
+    )
+
+# Bulk transfer endpoints are left out of the OpenAPI document so the chat agent's
+# workitems plugin never pulls a full dump into the model context
+@app.get("/workitems:export", include_in_schema=False)
+async def export_work_items_stream(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Stream every work item as NDJSON or CSV without building the whole payload in memory"""
+    return StreamingResponse(export_work_items(workitems, format), media_type=EXPORT_FORMATS[format])
+
+@app.post("/workitems:import", response_model=ImportResult, include_in_schema=False)
+async def import_work_items_stream(request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Upsert work items from an NDJSON or CSV upload, parsing the body as it streams in"""
+    return await import_work_items(workitems, request.stream(), format)
+
 @app.get("/workitemtypes", response_model=list[str])
-async def get_work_item_types():
-    return list(workItemTypes)
+async def get_work_item_types(request: Request, response: Response):
+    etag = store_etag()
+    if not_modified(request, response, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return workitems.values("WorkItemType")
 
 @app.get("/workitemstates", response_model=list[str])
-async def get_work_item_states():
-    return list(workItemStates)
+async def get_work_item_states(request: Request, response: Response):
+    etag = store_etag()
+    if not_modified(request, response, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return workitems.values("State")
 
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
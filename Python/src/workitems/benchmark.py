@@ -0,0 +1,297 @@
+"""Benchmark suite for the Work Items API.
+
+Generates a synthetic data set, drives every endpoint either in-process through
+an ASGI client or over HTTP against a uvicorn server, and reports throughput,
+p50/p95/p99 latency and memory per scenario.
+
+    python benchmark.py --sizes 1000,100000
+    python benchmark.py --mode http --sizes 100000 --concurrency 64
+    python benchmark.py --mode http --db --workers 4 --sizes 100000
+    python benchmark.py --sizes 100000 --output results.json
+    python benchmark.py --sizes 100000 --baseline results.json --max-regression 0.25
+
+With --baseline the run exits non-zero if any scenario's p95 latency grew by more
+than --max-regression (a fraction) compared to the baseline results.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import httpx
+
+try:
+    from .schemas import WorkItemsDTO
+    from .store import WorkItemStore
+except ImportError:
+    from schemas import WorkItemsDTO
+    from store import WorkItemStore
+
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+WORK_ITEM_TYPES = ["Bug", "Epic", "Feature", "Task", "Test Case", "User Story"]
+STATES = ["New", "Active", "Design", "Ready", "In Progress", "Resolved", "Closed"]
+TAGS = ["ui", "api", "mobile", "payments", "security", "performance", "accessibility", "search"]
+WORDS = (
+    "customer order payment page error login search report vendor invoice cart checkout profile "
+    "button screen printing mobile privacy menu account export import email password upload"
+).split()
+
+
+def generate_work_items(count: int, seed: int = 42, start_id: int = 1) -> list[WorkItemsDTO]:
+    """Create a reproducible synthetic data set with realistic value distributions."""
+    rng = random.Random(seed)
+    return [
+        WorkItemsDTO(
+            ID=id,
+            WorkItemType=rng.choice(WORK_ITEM_TYPES),
+            Title=" ".join(rng.choices(WORDS, k=rng.randint(3, 8))).capitalize(),
+            AssignedTo=f"User{rng.randint(1, 50)}" if rng.random() < 0.8 else "",
+            State=rng.choice(STATES),
+            Tags="; ".join(rng.sample(TAGS, k=rng.randint(0, 3))),
+        )
+        for id in range(start_id, start_id + count)
+    ]
+
+
+def scenarios(size: int, requests: int):
+    """Return (name, number of requests, request factory) for every endpoint.
+
+    A request factory maps the request number to (method, url, body); the body is sent
+    as JSON, or as is when it is bytes. Mutating scenarios use IDs above the data set so
+    they can run in order without clashing: create adds them, update and delete work on
+    the ones just created, and the batch scenarios do the same with batches of IDs.
+    """
+    rng = random.Random(7)
+    new_id = size + 1
+    batch = 100
+    batches = max(1, requests // batch)
+    # Imports upsert the same IDs, above the batch scenarios' range: the first creates them, the rest update them
+    import_id = new_id + requests + batches * batch
+
+    def batch_ids(i):
+        return [new_id + requests + i * batch + j for j in range(batch)]
+
+    def item(id, **changes):
+        return {"ID": id, "WorkItemType": "Bug", "Title": f"Benchmark item {id}", "AssignedTo": "User1",
+                "State": "New", "Tags": "benchmark", **changes}
+
+    return [
+        ("get_by_id", requests, lambda i: ("GET", f"/workitems/{rng.randint(1, size)}", None)),
+        ("list_page", requests, lambda i: ("GET", f"/workitems?limit=100&cursor={rng.randint(0, size)}", None)),
+        ("list_filtered", requests, lambda i: (
+            "GET", f"/workitems?type={rng.choice(WORK_ITEM_TYPES)}&state={rng.choice(STATES)}&limit=100", None)),
+        ("list_projected", requests, lambda i: ("GET", "/workitems?limit=1000&fields=Title,State", None)),
+        ("search", requests, lambda i: ("GET", f"/workitems/search?q={'+'.join(rng.sample(WORDS, 2))}", None)),
+        ("stats", requests, lambda i: ("GET", "/workitems/stats?group_by=assigned_to&type=Bug&state=New", None)),
+        ("changes", requests, lambda i: ("GET", "/workitems/changes?since=0&limit=100", None)),
+        ("types", requests, lambda i: ("GET", "/workitemtypes", None)),
+        ("states", requests, lambda i: ("GET", "/workitemstates", None)),
+        ("create", requests, lambda i: ("POST", "/workitems", item(new_id + i))),
+        ("update", requests, lambda i: ("PUT", f"/workitems/{new_id + i}", item(new_id + i, State="Active"))),
+        ("delete", requests, lambda i: ("DELETE", f"/workitems/{new_id + i}", None)),
+        ("batch_create", batches, lambda i: (
+            "POST", "/workitems:batch", {"items": [item(id) for id in batch_ids(i)]})),
+        ("batch_update", batches, lambda i: (
+            "PATCH", "/workitems:batch", {"items": [{"ID": id, "State": "Active"} for id in batch_ids(i)]})),
+        ("batch_delete", batches, lambda i: ("DELETE", "/workitems:batch", {"ids": batch_ids(i)})),
+        ("import", batches, lambda i: (
+            "POST", "/workitems:import",
+            "".join(json.dumps(item(import_id + j)) + "\n" for j in range(batch)).encode())),
+        ("export", max(1, requests // 100), lambda i: ("GET", "/workitems:export", None)),
+    ]
+
+
+async def run_scenario(client: httpx.AsyncClient, count: int, make_request, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    next_request = 0
+
+    async def worker():
+        nonlocal next_request, errors
+        while next_request < count:
+            i = next_request
+            next_request += 1
+            method, url, body = make_request(i)
+            start = time.perf_counter()
+            if isinstance(body, bytes):
+                response = await client.request(method, url, content=body)
+            else:
+                response = await client.request(method, url, json=body)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, count))))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput": count / elapsed,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+async def benchmark_asgi(size: int, args) -> dict:
+    """Drive the app in-process, with the store replaced by a synthetic one of the given size."""
+    try:
+        from . import api
+    except ImportError:
+        import api
+
+    tracemalloc.start()
+    store = WorkItemStore()
+    store.load(generate_work_items(size))
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    api.workitems = store
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        results = {
+            name: await run_scenario(client, count, make_request, args.concurrency)
+            for name, count, make_request in scenarios(size, args.requests)
+        }
+    return {"memory": {"store_bytes": store_bytes, "bytes_per_item": store_bytes / size}, "scenarios": results}
+
+
+async def benchmark_http(size: int, args) -> dict:
+    """Start uvicorn, stream the synthetic data set in through /workitems:import and load-test it over HTTP."""
+    port = _free_port()
+    env = dict(os.environ)
+    env.pop("WORKITEMS_DB_PATH", None)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.db:
+            env["WORKITEMS_DB_PATH"] = os.path.join(temp_dir, "workitems.db")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--workers", str(args.workers),
+             "--log-level", "warning"],
+            cwd=script_dir, env=env,
+        )
+        try:
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+                await _wait_until_ready(client)
+                work_items = generate_work_items(size)
+                body = "".join(work_item.model_dump_json() + "\n" for work_item in work_items).encode()
+                response = await client.post("/workitems:import", content=body)
+                response.raise_for_status()
+                results = {
+                    name: await run_scenario(client, count, make_request, args.concurrency)
+                    for name, count, make_request in scenarios(size, args.requests)
+                }
+            return {"memory": {"server_rss_bytes": _rss(server.pid)}, "scenarios": results}
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Return a message for every scenario whose p95 latency regressed beyond max_regression."""
+    regressions = []
+    for size, run in results.items():
+        for name, current in run["scenarios"].items():
+            previous = baseline.get(size, {}).get("scenarios", {}).get(name)
+            if previous and current["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+                regressions.append(
+                    f"{size} items / {name}: p95 {previous['p95_ms']:.2f} ms -> {current['p95_ms']:.2f} ms"
+                )
+    return regressions
+
+
+def print_results(size: int, run: dict):
+    print(f"\n=== {size:,} work items ===")
+    for key, value in run["memory"].items():
+        print(f"{key}: {value:,.0f}" if value is not None else f"{key}: n/a")
+    print(f"{'scenario':<16}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in run["scenarios"].items():
+        print(
+            f"{name:<16}{result['requests']:>10}{result['errors']:>8}{result['throughput']:>10.0f}"
+            f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+        )
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_ready(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/workitemtypes")).status_code == 200:
+                return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+        await asyncio.sleep(0.2)
+
+
+def _rss(pid: int) -> int | None:
+    """Resident memory of a process and its children (uvicorn workers) in bytes, read from /proc where available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            rss = next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return rss + sum(_rss(int(child)) or 0 for child in children.read().split())
+    except (OSError, StopIteration):
+        return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Work Items API")
+    parser.add_argument("--mode", choices=["asgi", "http"], default="asgi")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated data set sizes")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers in http mode (needs --db for more than one)")
+    parser.add_argument("--db", action="store_true", help="Use SQLite persistence in http mode")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --output")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+    if args.workers > 1 and not args.db:
+        parser.error("more than one worker needs --db, otherwise every worker has its own data")
+
+    results = {}
+    for size in (int(size) for size in args.sizes.split(",")):
+        run = await (benchmark_asgi(size, args) if args.mode == "asgi" else benchmark_http(size, args))
+        print_results(size, run)
+        results[str(size)] = run
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,18 @@
+"""Okapi BM25 scoring, shared by the work item search index and the handbook keyword index."""
+import math
+
+
+# Standard BM25 parameters: k1 controls term-frequency saturation, b length normalization
+K1 = 1.2
+B = 0.75
+
+
+def idf(document_count: int, document_frequency: int) -> float:
+    """Inverse document frequency of a term that occurs in document_frequency of document_count documents."""
+    return math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def term_score(idf: float, frequency, length, average_length: float, k1: float = K1, b: float = B):
+    """Score one query term adds to a document; frequency and length may also be NumPy arrays of documents."""
+    normalization = k1 * (1 - b + b * length / (average_length or 1))
+    return idf * frequency * (k1 + 1) / (frequency + normalization)
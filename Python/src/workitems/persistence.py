@@ -0,0 +1,163 @@
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterable
+
+try:
+    from .schemas import WorkItemsDTO
+    from .store import StaleVersionError
+except ImportError:
+    from schemas import WorkItemsDTO
+    from store import StaleVersionError
+
+
+COLUMNS = tuple(WorkItemsDTO.model_fields)
+
+
+class SqliteBackend:
+    """Durable storage for work items in a local SQLite database.
+
+    The database runs in WAL mode, so every mutation is an append to the
+    write-ahead log and SQLite folds the log back into the main file with
+    periodic checkpoints. Loading the whole table back is a single sequential
+    scan, which is much cheaper than re-parsing the CSV on every start.
+
+    The database can be shared by several processes (e.g. uvicorn workers). The
+    store version lives in the meta table and is only advanced inside a write
+    transaction, so two processes can never commit the same version; a process
+    whose in-memory copy is behind gets a StaleVersionError and catches up via
+    changes_since before retrying.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Transactions are managed explicitly so writes can take the lock up front
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction():
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS workitems (
+                    ID INTEGER PRIMARY KEY,
+                    WorkItemType TEXT NOT NULL,
+                    Title TEXT NOT NULL,
+                    AssignedTo TEXT NOT NULL,
+                    State TEXT NOT NULL,
+                    Tags TEXT NOT NULL,
+                    Version INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            # Databases created before versioning lack the Version column
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(workitems)")}
+            if "Version" not in columns:
+                self._conn.execute("ALTER TABLE workitems ADD COLUMN Version INTEGER NOT NULL DEFAULT 0")
+            # Tombstones for deleted items, so the change feed can report deletions after a restart
+            self._conn.execute("CREATE TABLE IF NOT EXISTS deleted (ID INTEGER PRIMARY KEY, Version INTEGER NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS workitems_version ON workitems (Version)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS deleted_version ON deleted (Version)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute(
+                """
+                INSERT OR IGNORE INTO meta (key, value) VALUES ('version', COALESCE((
+                    SELECT MAX(Version) FROM (
+                        SELECT Version FROM workitems UNION ALL SELECT Version FROM deleted
+                    )
+                ), 0))
+                """
+            )
+        self._data_version = self._read_data_version()
+
+    def is_empty(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM workitems LIMIT 1").fetchone() is None
+
+    def load(self) -> tuple[list[WorkItemsDTO], dict[int, int], dict[int, int], int]:
+        """Return every stored work item, the item versions, the versions of deleted IDs and the store version.
+
+        Rows were validated on the way in, so they are not re-validated.
+        """
+        with self._transaction(immediate=False):
+            self._data_version = self._read_data_version()
+            work_items = []
+            versions = {}
+            for row in self._conn.execute(f"SELECT {', '.join(COLUMNS)}, Version FROM workitems"):
+                work_items.append(WorkItemsDTO.model_construct(**dict(zip(COLUMNS, row))))
+                versions[row[0]] = row[-1]
+            deleted = dict(self._conn.execute("SELECT ID, Version FROM deleted"))
+            version = self._read_version()
+        return work_items, versions, deleted, version
+
+    def has_external_changes(self) -> bool:
+        """Return True if another connection committed since the last check. This is a cheap pragma read."""
+        data_version = self._read_data_version()
+        changed = data_version != self._data_version
+        self._data_version = data_version
+        return changed
+
+    def changes_since(self, version: int) -> tuple[list[tuple[WorkItemsDTO, int]], list[tuple[int, int]], int]:
+        """Return the (item, version) pairs written and (ID, version) pairs deleted after version, and the store version."""
+        with self._transaction(immediate=False):
+            puts = [
+                (WorkItemsDTO.model_construct(**dict(zip(COLUMNS, row))), row[-1])
+                for row in self._conn.execute(
+                    f"SELECT {', '.join(COLUMNS)}, Version FROM workitems WHERE Version > ?", (version,)
+                )
+            ]
+            deletes = list(self._conn.execute("SELECT ID, Version FROM deleted WHERE Version > ?", (version,)))
+            current = self._read_version()
+        return puts, deletes, current
+
+    def insert(self, work_items: Iterable[WorkItemsDTO]):
+        """Insert initial items at version 0, used to seed an empty database.
+
+        Items that already exist are left alone, so several processes may seed at once.
+        """
+        with self._transaction():
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO workitems ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [_row(work_item) for work_item in work_items],
+            )
+
+    def commit(self, puts: list[WorkItemsDTO], deletes: list[int], version: int):
+        """Write and delete items as store version, which must directly follow the stored one."""
+        assignments = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS[1:] + ("Version",))
+        with self._transaction():
+            current = self._read_version()
+            if current != version - 1:
+                raise StaleVersionError(f"store is at version {current}, cannot commit version {version}")
+            self._conn.executemany(
+                f"INSERT INTO workitems ({', '.join(COLUMNS)}, Version) VALUES ({', '.join('?' * (len(COLUMNS) + 1))}) "
+                f"ON CONFLICT(ID) DO UPDATE SET {assignments}",
+                [_row(work_item) + (version,) for work_item in puts],
+            )
+            self._conn.executemany("DELETE FROM deleted WHERE ID = ?", [(work_item.ID,) for work_item in puts])
+            self._conn.executemany("DELETE FROM workitems WHERE ID = ?", [(id,) for id in deletes])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO deleted (ID, Version) VALUES (?, ?)", [(id, version) for id in deletes]
+            )
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (version,))
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self, immediate: bool = True):
+        # BEGIN IMMEDIATE takes the write lock at the start, so the version read inside
+        # a write transaction cannot change before it commits
+        self._conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _read_version(self) -> int:
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _row(work_item: WorkItemsDTO) -> tuple:
+    return tuple(getattr(work_item, column) for column in COLUMNS)
@@ -0,0 +1,94 @@
+from pydantic import BaseModel, Field
+
+
+MAX_BATCH_SIZE = 10000
+
+
+class WorkItemsDTO(BaseModel):
+    ID: int
+    WorkItemType: str
+    Title: str
+    AssignedTo: str
+    State: str
+    Tags: str
+
+
+class WorkItemsView(BaseModel):
+    """A work item projected down to the fields requested by the caller."""
+    ID: int
+    WorkItemType: str | None = None
+    Title: str | None = None
+    AssignedTo: str | None = None
+    State: str | None = None
+    Tags: str | None = None
+
+
+class WorkItemPatch(BaseModel):
+    """Partial update for one work item; fields left out are not changed."""
+    ID: int
+    WorkItemType: str | None = None
+    Title: str | None = None
+    AssignedTo: str | None = None
+    State: str | None = None
+    Tags: str | None = None
+
+
+class WorkItemsBatch(BaseModel):
+    items: list[WorkItemsDTO] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class WorkItemPatchBatch(BaseModel):
+    items: list[WorkItemPatch] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class WorkItemIdBatch(BaseModel):
+    ids: list[int] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class BatchItemResult(BaseModel):
+    ID: int
+    status: int
+    detail: str | None = None
+
+
+class BatchResult(BaseModel):
+    """Per-item outcome of a batch request. Batches are all-or-nothing: applied is False if any item failed."""
+    applied: bool
+    results: list[BatchItemResult]
+
+
+class ImportLineError(BaseModel):
+    line: int
+    detail: str
+
+
+class ImportResult(BaseModel):
+    """Summary of a streaming import. Valid records are applied even if other lines fail."""
+    created: int
+    updated: int
+    failed: int
+    errors: list[ImportLineError]
+
+
+class WorkItemChange(BaseModel):
+    ID: int
+    version: int
+    deleted: bool
+    item: WorkItemsDTO | None = None
+
+
+class WorkItemChanges(BaseModel):
+    """Changes after a version. Pass version as since on the next call to continue from here."""
+    version: int
+    has_more: bool
+    changes: list[WorkItemChange]
+
+
+class WorkItemSearchHit(WorkItemsDTO):
+    score: float
+
+
+class WorkItemStats(BaseModel):
+    """Number of matching work items, and counts per group ordered by count (largest first)."""
+    total: int
+    groups: list[dict[str, str | int]]
@@ -0,0 +1,77 @@
+import heapq
+import re
+
+try:
+    from .bm25 import idf, term_score
+    from .schemas import WorkItemsDTO
+except ImportError:
+    from bm25 import idf, term_score
+    from schemas import WorkItemsDTO
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class WorkItemSearchIndex:
+    """Inverted index over work item titles and tags with BM25 ranking.
+
+    The index is updated incrementally as items are added and removed, and a
+    query only touches the postings of its own terms, so search cost depends on
+    how common the query terms are rather than on the total number of items.
+    """
+
+    def __init__(self):
+        # term -> {work item ID: term frequency}
+        self._postings: dict[str, dict[int, int]] = {}
+        # work item ID -> number of indexed tokens
+        self._lengths: dict[int, int] = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, work_item: WorkItemsDTO):
+        tokens = _document_tokens(work_item)
+        for term in tokens:
+            postings = self._postings.setdefault(term, {})
+            postings[work_item.ID] = postings.get(work_item.ID, 0) + 1
+        self._lengths[work_item.ID] = len(tokens)
+        self._total_length += len(tokens)
+
+    def remove(self, work_item: WorkItemsDTO):
+        if self._lengths.pop(work_item.ID, None) is None:
+            return
+        tokens = _document_tokens(work_item)
+        self._total_length -= len(tokens)
+        for term in set(tokens):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(work_item.ID, None)
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, top: int = 10) -> list[tuple[int, float]]:
+        """Return up to top (ID, score) pairs for the query, best match first."""
+        document_count = len(self._lengths)
+        if not document_count:
+            return []
+        average_length = self._total_length / document_count
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            term_idf = idf(document_count, len(postings))
+            for id, frequency in postings.items():
+                scores[id] = scores.get(id, 0.0) + term_score(term_idf, frequency, self._lengths[id], average_length)
+        return heapq.nlargest(top, scores.items(), key=lambda hit: (hit[1], -hit[0]))
+
+
+def _document_tokens(work_item: WorkItemsDTO) -> list[str]:
+    # Tags are separated by ';' but may contain spaces, so they are tokenized like the title
+    return tokenize(work_item.Title) + tokenize(work_item.Tags)
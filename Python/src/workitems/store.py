@@ -0,0 +1,385 @@
+import threading
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from itertools import product
+from typing import Iterable
+
+try:
+    from .schemas import WorkItemsDTO
+    from .search import WorkItemSearchIndex
+except ImportError:
+    from schemas import WorkItemsDTO
+    from search import WorkItemSearchIndex
+
+
+# Fields that get a secondary index (field value -> set of work item IDs)
+INDEXED_FIELDS = ("WorkItemType", "State", "AssignedTo")
+
+
+# A commit retries when another process sharing the backend committed first
+MAX_COMMIT_ATTEMPTS = 10
+
+
+class VersionConflict(Exception):
+    """Raised when an item changed since the version the caller based its change on."""
+
+    def __init__(self, id: int, expected: int, actual: int):
+        super().__init__(f"work item {id} is at version {actual}, expected {expected}")
+        self.id = id
+        self.expected = expected
+        self.actual = actual
+
+
+class StaleVersionError(Exception):
+    """Raised by a backend when another process committed a newer store version first."""
+
+
+def split_tags(tags: str) -> list[str]:
+    """Split a 'tag1; tag2' Tags value into normalized (lower-case) tags."""
+    return [tag.strip().lower() for tag in tags.split(";") if tag.strip()]
+
+
+class WorkItemStore:
+    """In-memory work item store with a primary-key index and secondary indexes.
+
+    Items are kept in a dict keyed by ID, so lookups, updates and deletes are O(1)
+    regardless of how many items are loaded. Each field in INDEXED_FIELDS has a
+    secondary index mapping a field value to the IDs that currently carry it,
+    and individual tags are indexed the same way. A full-text index over titles
+    and tags backs search(). All indexes are kept up to date on every
+    create/update/delete.
+
+    If a backend is given (see persistence.py) every mutation is written through
+    to it before the in-memory state changes, so a failed write leaves the store
+    untouched.
+
+    Every mutation (a single change or a whole batch) bumps the store version and
+    stamps the touched items with it. The versions drive ETags, optimistic
+    concurrency and the change feed.
+
+    Mutations are serialized by a lock and never change items in place, so readers
+    always see whole items. Several processes can share one persistent backend: a
+    process catches up with the others' commits in refresh(), and a commit that
+    loses the race to another process is re-validated and retried.
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._lock = threading.RLock()
+        self._items: dict[int, WorkItemsDTO] = {}
+        self._indexes: dict[str, dict[str, set[int]]] = {field: {} for field in INDEXED_FIELDS}
+        self._tags: dict[str, set[int]] = {}
+        self._search = WorkItemSearchIndex()
+        # Sorted ID list used for keyset pagination, rebuilt lazily after inserts/deletes
+        self._sorted_ids: list[int] | None = None
+        self._version = 0
+        self._versions: dict[int, int] = {}
+        # ID -> version of its latest change (including deletes), ordered by version
+        self._changes: OrderedDict[int, int] = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, id: int):
+        return id in self._items
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def get(self, id: int) -> WorkItemsDTO | None:
+        return self._items.get(id)
+
+    def all(self) -> list[WorkItemsDTO]:
+        return list(self._items.values())
+
+    def ids(self) -> list[int]:
+        """Return all IDs in ascending order.
+
+        The returned list is a snapshot: mutations replace it rather than change it,
+        so callers can keep iterating over it while the store changes.
+        """
+        with self._lock:
+            return self._ordered_ids()
+
+    def ids_for(self, field: str, value: str) -> set[int]:
+        """Return the IDs of the items whose indexed field equals value."""
+        return self._indexes[field].get(value, set())
+
+    def find(self, field: str, value: str) -> list[WorkItemsDTO]:
+        """Return the items whose indexed field equals value."""
+        return [self._items[id] for id in self.ids_for(field, value)]
+
+    def values(self, field: str) -> list[str]:
+        """Return the distinct values currently present for an indexed field."""
+        return list(self._indexes[field])
+
+    def query(self, filters: dict[str, str] | None = None, tag: str | None = None,
+              after: int | None = None, limit: int | None = None) -> list[WorkItemsDTO]:
+        """Return items matching all filters, ordered by ID.
+
+        filters maps indexed field names to the required value and tag restricts the
+        result to items carrying that tag. Pagination is keyset-based: only items with
+        an ID greater than after are returned, at most limit of them.
+        """
+        with self._lock:
+            matching = self._matching_ids(filters, tag)
+            ids = self._ordered_ids() if matching is None else sorted(matching)
+            start = bisect_right(ids, after) if after is not None else 0
+            end = start + limit if limit is not None else None
+            return [self._items[id] for id in ids[start:end]]
+
+    def count(self, group_by: list[str], filters: dict[str, str] | None = None,
+              tag: str | None = None) -> tuple[int, Counter]:
+        """Count the items matching all filters, grouped by the given fields.
+
+        group_by holds indexed field names and/or "Tags"; an item with several tags
+        counts once for each of its tags. Returns the number of matching items and a
+        Counter keyed by tuples of group values.
+
+        Without filters, grouping by one field or by tag reads the set sizes of its
+        index. Filtered counts visit only the matching items; unfiltered counts
+        grouped by several fields visit every item.
+        """
+        with self._lock:
+            matching = self._matching_ids(filters, tag)
+            if matching is None and len(group_by) == 1:
+                # The secondary index already holds the answer: one set size per value
+                index = self._tags if group_by[0] == "Tags" else self._indexes[group_by[0]]
+                groups = Counter({(value, ): len(ids) for value, ids in index.items()})
+                return len(self._items), groups
+
+            ids = self._items.keys() if matching is None else matching
+            groups = Counter()
+            for id in ids:
+                work_item = self._items[id]
+                keys = [
+                    split_tags(work_item.Tags) if field == "Tags" else [getattr(work_item, field)]
+                    for field in group_by
+                ]
+                groups.update(product(*keys))
+            return len(ids), groups
+
+    def search(self, query: str, top: int = 10) -> list[tuple[WorkItemsDTO, float]]:
+        """Return up to top (item, score) pairs whose title or tags match the query, best first."""
+        with self._lock:
+            return [(self._items[id], score) for id, score in self._search.search(query, top)]
+
+    def version(self) -> int:
+        """Return the store version, which increases with every committed mutation."""
+        return self._version
+
+    def item_version(self, id: int) -> int:
+        """Return the store version at which the item was last changed (0 if never changed)."""
+        return self._versions.get(id, 0)
+
+    def changes_since(self, version: int, limit: int | None = None) -> tuple[list[tuple[int, int, WorkItemsDTO | None]], bool]:
+        """Return (ID, version, item) for items changed after version, oldest first, and whether more remain.
+
+        item is None for deleted items. The change log keeps one entry per ID, moved to
+        the end on every change, so only the entries newer than version are visited.
+        A page never ends in the middle of a version, so callers can resume from the
+        version of the last change returned.
+        """
+        changes = []
+        with self._lock:
+            for id, changed_at in reversed(self._changes.items()):
+                if changed_at <= version:
+                    break
+                changes.append((id, changed_at))
+        changes.reverse()
+        has_more = False
+        if limit is not None and len(changes) > limit:
+            end = limit
+            while end < len(changes) and changes[end][1] == changes[end - 1][1]:
+                end += 1
+            has_more = end < len(changes)
+            changes = changes[:end]
+        return [(id, changed_at, self._items.get(id)) for id, changed_at in changes], has_more
+
+    def load(self, work_items: Iterable[WorkItemsDTO], versions: dict[int, int] | None = None,
+             deleted: dict[int, int] | None = None, version: int = 0):
+        """Bulk-load items into memory without writing them to the backend.
+
+        versions, deleted and version restore the item versions, the deletions and the
+        store version recorded by a backend, so the change log survives a restart.
+        """
+        with self._lock:
+            for work_item in work_items:
+                self._items[work_item.ID] = work_item
+                self._index(work_item)
+            self._sorted_ids = None
+            changed = {**(deleted or {}), **{id: v for id, v in (versions or {}).items() if v}}
+            for id, changed_at in sorted(changed.items(), key=lambda change: change[1]):
+                self._versions[id] = changed_at
+                self._changes[id] = changed_at
+            self._version = max(self._version, version, *changed.values(), 0)
+
+    def import_items(self, work_items: Iterable[WorkItemsDTO]):
+        """Seed the store with initial items, persisting them in a single backend write."""
+        work_items = list(work_items)
+        if self._backend is not None:
+            self._backend.insert(work_items)
+        self.load(work_items)
+
+    def refresh(self, force: bool = False):
+        """Catch up with changes other processes committed to a shared backend.
+
+        Checking is a cheap no-op unless the backend reports external changes.
+        """
+        if self._backend is None or not (self._backend.has_external_changes() or force):
+            return
+        with self._lock:
+            puts, deletes, version = self._backend.changes_since(self._version)
+            self._apply(puts, deletes)
+            self._version = max(self._version, version)
+
+    def add(self, work_item: WorkItemsDTO) -> WorkItemsDTO:
+        return self.add_many([work_item])[0]
+
+    def update(self, id: int, expected_version: int | None = None, **changes) -> WorkItemsDTO:
+        """Apply the given field changes to an existing item and re-index it.
+
+        If expected_version is given the update only succeeds if the item is still at
+        that version (optimistic concurrency), otherwise VersionConflict is raised.
+        """
+        expected = {id: expected_version} if expected_version is not None else None
+        return self.update_many({id: changes}, expected)[0]
+
+    def delete(self, id: int, expected_version: int | None = None) -> WorkItemsDTO:
+        expected = {id: expected_version} if expected_version is not None else None
+        return self.delete_many([id], expected)[0]
+
+    def add_many(self, work_items: list[WorkItemsDTO]) -> list[WorkItemsDTO]:
+        """Add several new items atomically: either all are added or none."""
+        def prepare():
+            ids = [work_item.ID for work_item in work_items]
+            if len(set(ids)) != len(ids) or any(id in self._items for id in ids):
+                raise KeyError("duplicate work item ID in batch")
+            return work_items, []
+
+        return self._commit(prepare)[0]
+
+    def update_many(self, changes: dict[int, dict], expected_versions: dict[int, int] | None = None) -> list[WorkItemsDTO]:
+        """Apply field changes to several existing items atomically."""
+        def prepare():
+            self._check(changes, expected_versions)
+            return [self._items[id].model_copy(update=fields) for id, fields in changes.items()], []
+
+        return self._commit(prepare)[0]
+
+    def upsert_many(self, work_items: list[WorkItemsDTO]) -> tuple[int, int]:
+        """Insert or replace several items atomically and return the (created, updated) counts."""
+        # Later duplicates of the same ID win, as they would if applied one by one
+        work_items = list({work_item.ID: work_item for work_item in work_items}.values())
+        created = 0
+
+        def prepare():
+            nonlocal created
+            created = sum(1 for work_item in work_items if work_item.ID not in self._items)
+            return work_items, []
+
+        self._commit(prepare)
+        return created, len(work_items) - created
+
+    def delete_many(self, ids: list[int], expected_versions: dict[int, int] | None = None) -> list[WorkItemsDTO]:
+        """Delete several existing items atomically."""
+        def prepare():
+            if len(set(ids)) != len(ids):
+                raise KeyError("duplicate work item ID in batch")
+            self._check(ids, expected_versions)
+            return [], ids
+
+        return self._commit(prepare)[1]
+
+    def _check(self, ids: Iterable[int], expected_versions: dict[int, int] | None):
+        missing = [id for id in ids if id not in self._items]
+        if missing:
+            raise KeyError(missing[0])
+        for id, expected in (expected_versions or {}).items():
+            if self.item_version(id) != expected:
+                raise VersionConflict(id, expected, self.item_version(id))
+
+    def _commit(self, prepare) -> tuple[list[WorkItemsDTO], list[WorkItemsDTO]]:
+        """Validate and commit one mutation as a new store version.
+
+        prepare() checks the mutation against the current state and returns the items
+        to write and the IDs to delete. If another process committed to a shared
+        backend in the meantime, the store catches up and prepare() runs again.
+        Returns the written and the deleted items.
+        """
+        with self._lock:
+            for attempt in range(MAX_COMMIT_ATTEMPTS):
+                self.refresh(force=attempt > 0)
+                puts, deletes = prepare()
+                version = self._version + 1
+                if self._backend is not None:
+                    try:
+                        self._backend.commit(puts, deletes, version)
+                    except StaleVersionError:
+                        continue
+                deleted = self._apply([(work_item, version) for work_item in puts], [(id, version) for id in deletes])
+                self._version = version
+                return puts, deleted
+            raise StaleVersionError(f"gave up after {MAX_COMMIT_ATTEMPTS} conflicting commits")
+
+    def _apply(self, puts: list[tuple[WorkItemsDTO, int]], deletes: list[tuple[int, int]]) -> list[WorkItemsDTO]:
+        """Apply committed writes and deletes, in version order, to the in-memory state and indexes."""
+        deleted = []
+        changes = [(version, work_item, work_item.ID) for work_item, version in puts]
+        changes += [(version, None, id) for id, version in deletes]
+        changes.sort(key=lambda change: change[0])
+        for version, work_item, id in changes:
+            existing = self._items.pop(id, None)
+            if existing is not None:
+                self._unindex(existing)
+            if work_item is None:
+                self._versions.pop(id, None)
+                if existing is not None:
+                    deleted.append(existing)
+            else:
+                self._items[id] = work_item
+                self._index(work_item)
+                self._versions[id] = version
+            if (existing is None) != (work_item is None):
+                self._sorted_ids = None
+            self._changes[id] = version
+            self._changes.move_to_end(id)
+        return deleted
+
+    def _matching_ids(self, filters: dict[str, str] | None, tag: str | None) -> set[int] | None:
+        """Intersect the index entries for the filters, smallest first. None means no filter was given."""
+        candidates = [self.ids_for(field, value) for field, value in (filters or {}).items()]
+        if tag is not None:
+            candidates.append(self._tags.get(tag.strip().lower(), set()))
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        return candidates[0].intersection(*candidates[1:])
+
+    def _ordered_ids(self) -> list[int]:
+        if self._sorted_ids is None:
+            self._sorted_ids = sorted(self._items)
+        return self._sorted_ids
+
+    def _index(self, work_item: WorkItemsDTO):
+        for field, index in self._indexes.items():
+            index.setdefault(getattr(work_item, field), set()).add(work_item.ID)
+        for tag in split_tags(work_item.Tags):
+            self._tags.setdefault(tag, set()).add(work_item.ID)
+        self._search.add(work_item)
+
+    def _unindex(self, work_item: WorkItemsDTO):
+        for field, index in self._indexes.items():
+            _discard(index, getattr(work_item, field), work_item.ID)
+        for tag in split_tags(work_item.Tags):
+            _discard(self._tags, tag, work_item.ID)
+        self._search.remove(work_item)
+
+
+def _discard(index: dict[str, set[int]], value: str, id: int):
+    ids = index.get(value)
+    if ids is None:
+        return
+    ids.discard(id)
+    if not ids:
+        del index[value]
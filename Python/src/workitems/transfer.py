@@ -0,0 +1,126 @@
+import csv
+import io
+from typing import AsyncIterable, AsyncIterator
+
+from pydantic import ValidationError
+
+try:
+    from .schemas import ImportLineError, ImportResult, WorkItemsDTO
+    from .store import WorkItemStore
+except ImportError:
+    from schemas import ImportLineError, ImportResult, WorkItemsDTO
+    from store import WorkItemStore
+
+
+COLUMNS = list(WorkItemsDTO.model_fields)
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Number of work items serialized or applied per step; keeps memory flat and gives
+# the event loop a chance to serve other requests between steps
+CHUNK_SIZE = 1000
+# Import errors reported back to the caller; the failed count is always exact
+MAX_REPORTED_ERRORS = 100
+
+
+async def export_work_items(store: WorkItemStore, format: str) -> AsyncIterator[bytes]:
+    """Serialize every work item lazily, one chunk of CHUNK_SIZE items at a time."""
+    ids = store.ids()
+    if format == "csv":
+        yield _csv_rows([COLUMNS])
+    for start in range(0, len(ids), CHUNK_SIZE):
+        # Items deleted since the export started are skipped
+        chunk = [item for item in map(store.get, ids[start:start + CHUNK_SIZE]) if item is not None]
+        if format == "csv":
+            yield _csv_rows([getattr(item, column) for column in COLUMNS] for item in chunk)
+        else:
+            yield "".join(item.model_dump_json() + "\n" for item in chunk).encode()
+
+
+async def import_work_items(store: WorkItemStore, body: AsyncIterable[bytes], format: str) -> ImportResult:
+    """Parse an uploaded NDJSON or CSV body as it arrives and upsert it into the store chunk by chunk.
+
+    Each chunk is applied atomically, but the import as a whole is not: chunks applied
+    before a bad line stay applied, and bad lines are skipped and reported.
+    """
+    result = ImportResult(created=0, updated=0, failed=0, errors=[])
+    chunk = []
+    header = None
+    async for line_number, record in _records(body, join_quoted=format == "csv"):
+        if isinstance(record, UnicodeDecodeError):
+            _fail(result, line_number, f"line: not valid UTF-8 ({record.reason} at byte {record.start})")
+            if format == "csv" and header is None:
+                # Without the header no row can be read
+                return result
+            continue
+        if format == "csv" and header is None:
+            header = next(csv.reader([record]))
+            continue
+        try:
+            if format == "csv":
+                chunk.append(WorkItemsDTO(**dict(zip(header, next(csv.reader([record]))))))
+            else:
+                chunk.append(WorkItemsDTO.model_validate_json(record))
+        except ValidationError as e:
+            _fail(result, line_number, "; ".join(f"{'.'.join(map(str, error['loc'])) or 'line'}: {error['msg']}" for error in e.errors()))
+            continue
+        if len(chunk) >= CHUNK_SIZE:
+            _apply(store, chunk, result)
+            chunk = []
+    if chunk:
+        _apply(store, chunk, result)
+    return result
+
+
+def _fail(result: ImportResult, line_number: int, detail: str):
+    result.failed += 1
+    if len(result.errors) < MAX_REPORTED_ERRORS:
+        result.errors.append(ImportLineError(line=line_number, detail=detail))
+
+
+def _apply(store: WorkItemStore, chunk: list[WorkItemsDTO], result: ImportResult):
+    created, updated = store.upsert_many(chunk)
+    result.created += created
+    result.updated += updated
+
+
+async def _records(body: AsyncIterable[bytes], join_quoted: bool) -> AsyncIterator[tuple[int, str | UnicodeDecodeError]]:
+    """Split a byte stream into non-blank records, yielding (line number, record).
+
+    A CSV field may contain a quoted line break, so with join_quoted lines are
+    joined until the record holds an even number of quote characters. A line that
+    is not valid UTF-8 is yielded as its UnicodeDecodeError, and the record it was
+    part of is dropped.
+    """
+    buffer = b""
+    line_number = 0
+    pending = ""
+    async for data in body:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            try:
+                pending += line.decode("utf-8-sig" if line_number == 1 else "utf-8")
+            except UnicodeDecodeError as e:
+                yield line_number, e
+                pending = ""
+                continue
+            if join_quoted and pending.count('"') % 2:
+                pending += "\n"
+                continue
+            if pending.strip():
+                yield line_number, pending.rstrip("\r")
+            pending = ""
+    try:
+        pending += buffer.decode("utf-8-sig" if line_number == 0 else "utf-8")
+    except UnicodeDecodeError as e:
+        yield line_number + 1, e
+        return
+    if pending.strip():
+        yield line_number + 1, pending.rstrip("\r")
+
+
+def _csv_rows(rows) -> bytes:
+    output = io.StringIO()
+    csv.writer(output, lineterminator="\n").writerows(rows)
+    return output.getvalue().encode()